@@ -0,0 +1,117 @@
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+from api import env
+from api.executor import ExecutorManager
+
+logger = logging.getLogger(__name__)
+
+class Cache:
+  """
+  Thread safe in-memory cache with LRU eviction and optional TTL.
+  Size and TTL (in seconds) can be overwritten by KT_CACHE_<NAME>_SIZE and KT_CACHE_<NAME>_TTL.
+  A size <= 0 means unbounded, a TTL <= 0 means entries never expire.
+  Entries older than the soft TTL (KT_CACHE_<NAME>_SOFT_TTL, <= 0 disabled) are stale:
+  getOrLoad still returns them, but refreshes them in the background.
+  """
+
+  MISSING = object()
+
+  def __init__(self, name: str, max_size: int = 1000, ttl: int = 0, soft_ttl: int = 0):
+    self.name = name
+    self.max_size = env.getInt(f"KT_CACHE_{name.upper()}_SIZE", max_size)
+    self.ttl = env.getInt(f"KT_CACHE_{name.upper()}_TTL", ttl)
+    self.soft_ttl = env.getInt(f"KT_CACHE_{name.upper()}_SOFT_TTL", soft_ttl)
+    self._entries: OrderedDict = OrderedDict()
+    self._lock = threading.Lock()
+    self._refreshing = set()
+
+  def get(self, key, default = None):
+    with self._lock:
+      entry = self._entries.get(key, Cache.MISSING)
+      if entry is Cache.MISSING:
+        return default
+      value, stored_at = entry
+      if self._expired(stored_at):
+        del self._entries[key]
+        return default
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, age: float = 0):
+    """
+    Stores value for key. age (in seconds) backdates the entry, e.g. for values restored from a store.
+    """
+    with self._lock:
+      self._entries[key] = (value, time.monotonic() - max(age, 0))
+      self._entries.move_to_end(key)
+      while self.max_size > 0 and len(self._entries) > self.max_size:
+        evicted, _ = self._entries.popitem(last=False)
+        logger.debug(f"cache {self.name} full => evicted {evicted}")
+
+  def pop(self, key, default = None):
+    with self._lock:
+      entry = self._entries.pop(key, Cache.MISSING)
+      if entry is Cache.MISSING or self._expired(entry[1]):
+        return default
+      return entry[0]
+
+  def getOrLoad(self, key, loader, *args):
+    """
+    Returns the cached value for key. Without one (or past the TTL) loader(*args) is called
+    and its result cached; a stale value is returned right away and refreshed in the background.
+    """
+    value = self.get(key, Cache.MISSING)
+    if value is Cache.MISSING:
+      value = loader(*args)
+      self.set(key, value)
+    elif self.isStale(key):
+      self.refresh(key, loader, *args)
+    return value
+
+  def isStale(self, key) -> bool:
+    with self._lock:
+      entry = self._entries.get(key, Cache.MISSING)
+      return entry is not Cache.MISSING and self.soft_ttl > 0 and time.monotonic() - entry[1] > self.soft_ttl
+
+  def refresh(self, key, loader, *args):
+    """
+    Reloads the value for key with loader(*args) in the background, at most once at a time per key.
+    If loader fails or returns Cache.MISSING, the old value is kept.
+    """
+    with self._lock:
+      if key in self._refreshing:
+        return
+      self._refreshing.add(key)
+    logger.debug(f"cache {self.name}: refreshing stale entry {key}")
+    future = ExecutorManager().submitBackground(self._refresh, key, loader, *args)
+    future.add_done_callback(lambda _: self._refreshDone(key))
+
+  def _refresh(self, key, loader, *args):
+    value = loader(*args)
+    if value is not Cache.MISSING:
+      self.set(key, value)
+
+  def _refreshDone(self, key):
+    with self._lock:
+      self._refreshing.discard(key)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+  def values(self) -> list:
+    with self._lock:
+      return [value for value, stored_at in self._entries.values() if not self._expired(stored_at)]
+
+  def _expired(self, stored_at: float) -> bool:
+    return self.ttl > 0 and time.monotonic() - stored_at > self.ttl
+
+  def __contains__(self, key) -> bool:
+    return self.get(key, Cache.MISSING) is not Cache.MISSING
+
+  def __len__(self) -> int:
+    with self._lock:
+      return len(self._entries)
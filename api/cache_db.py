@@ -0,0 +1,103 @@
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+_CACHE_DIR = os.environ.get('KT_CACHE_FOLDER', '/cache')
+# not in KT_CACHE_FOLDER, that folder is served as static/images/cache
+_CACHE_DB = os.environ.get('KT_CACHE_DB', os.environ.get('KT_DATA_FOLDER', '/data') + '/cache.sqlite3')
+_LEGACY_CACHE_DB = _CACHE_DIR + '/cache.sqlite3'
+
+class CacheDb:
+  """
+  Small sqlite database in the data folder (KT_DATA_FOLDER).
+  Holds data, that can be rebuilt at any time from the sources (movie metadata, ...),
+  so it is kept apart from the real K-inder database (KT_DATABASE_URI).
+  Setting KT_CACHE_DB to '' or '-' disables it.
+  """
+
+  _instance = None
+  _instance_lock = threading.Lock()
+
+  def __new__(cls, *args, **kwargs):
+    with cls._instance_lock:
+      if cls._instance is None:
+        instance = super(CacheDb, cls).__new__(cls)
+        instance._lock = threading.RLock()
+        instance._connection = instance._connect()
+        cls._instance = instance
+    return cls._instance
+
+  def _connect(self) -> sqlite3.Connection|None:
+    if _CACHE_DB is None or _CACHE_DB == '' or _CACHE_DB == '-':
+      logger.info(f"No cache database set => persistent cache will be disabled!")
+      return None
+
+    self._removeLegacyDb()
+    try:
+      connection = sqlite3.connect(_CACHE_DB, check_same_thread=False, isolation_level=None)
+      logger.debug(f"using cache database {_CACHE_DB}")
+      return connection
+    except sqlite3.Error as e:
+      logger.error(f"Could not open cache database {_CACHE_DB} => persistent cache will be disabled! {e}")
+      return None
+
+  def _removeLegacyDb(self):
+    # older versions created the database in the (public) cache folder, its content can be rebuilt
+    if os.path.abspath(_LEGACY_CACHE_DB) == os.path.abspath(_CACHE_DB):
+      return
+    for path in [_LEGACY_CACHE_DB, _LEGACY_CACHE_DB + '-journal', _LEGACY_CACHE_DB + '-wal', _LEGACY_CACHE_DB + '-shm']:
+      try:
+        if os.path.isfile(path):
+          os.remove(path)
+          logger.info(f"removed old cache database {path} from the cache folder")
+      except OSError as e:
+        logger.error(f"Could not remove old cache database {path}: {e}")
+
+  def isDisabled(self) -> bool:
+    return self._connection is None
+
+  def select(self, query: str, parameters = ()) -> list:
+    if self._connection is None:
+      return []
+
+    with self._lock:
+      try:
+        return self._connection.execute(query, parameters).fetchall()
+      except sqlite3.Error as e:
+        logger.error(f"Exception during cache db select '{query}': {e}")
+        return []
+
+  def execute(self, query: str, parameters = ()) -> bool:
+    if self._connection is None:
+      return False
+
+    with self._lock:
+      try:
+        self._connection.execute(query, parameters)
+        return True
+      except sqlite3.Error as e:
+        logger.error(f"Exception during cache db execute '{query}': {e}")
+        return False
+
+  def executemany(self, query: str, parameters: list) -> bool:
+    if self._connection is None:
+      return False
+
+    with self._lock:
+      try:
+        self._connection.execute('BEGIN')
+        self._connection.executemany(query, parameters)
+        self._connection.execute('COMMIT')
+        return True
+      except sqlite3.Error as e:
+        logger.error(f"Exception during cache db executemany '{query}': {e}")
+        if self._connection.in_transaction:
+          self._connection.execute('ROLLBACK')
+        return False
+
+  @staticmethod
+  def getInstance() -> 'CacheDb':
+    return CacheDb()
@@ -0,0 +1,140 @@
+from collections import deque
+from contextlib import contextmanager
+from enum import Enum
+import logging
+import threading
+import time
+
+from api import env
+
+logger = logging.getLogger(__name__)
+
+_WINDOW = env.getInt('KT_BREAKER_WINDOW', 20)
+_MIN_CALLS = env.getInt('KT_BREAKER_MIN_CALLS', 5)
+_ERROR_RATE = env.getFloat('KT_BREAKER_ERROR_RATE', 0.5)
+_OPEN_TIME = env.getFloat('KT_BREAKER_OPEN_TIME', 5)
+_SLOW_CALL_RATIO = env.getFloat('KT_BREAKER_SLOW_CALL_RATIO', 0.8)
+_SLOW_CALL_PROBE_FACTOR = env.getFloat('KT_BREAKER_SLOW_CALL_PROBE_FACTOR', 10)
+_SLOW_CALL_MIN = env.getFloat('KT_BREAKER_SLOW_CALL_MIN', 0.25)
+
+class BreakerState(Enum):
+  CLOSED = "closed"
+  OPEN = "open"
+  HALF_OPEN = "half-open"
+
+class CircuitOpenError(LookupError):
+  pass
+
+class StatusCodeError(LookupError):
+
+  def __init__(self, status_code: int, message: str|None = None):
+    super().__init__(message if message is not None else f"Unexpected status code {status_code}")
+    self.status_code = status_code
+
+class CircuitBreaker:
+  """
+  Circuit breaker for the calls to one source, fed by the results of the real calls.
+  Opens, when at least KT_BREAKER_ERROR_RATE of the last KT_BREAKER_WINDOW calls failed
+  or were slow (took longer than KT_BREAKER_SLOW_CALL_RATIO of the timeout).
+  Once the latency of the availability probes is known, a call is already slow, when it took
+  longer than KT_BREAKER_SLOW_CALL_PROBE_FACTOR times that latency (but at least KT_BREAKER_SLOW_CALL_MIN).
+  Bulk calls (library listings, ...) are expected to be slow, only their failures count.
+  While open, calls fail immediately with a CircuitOpenError. After KT_BREAKER_OPEN_TIME
+  seconds it is half-open and lets one trial call through, which closes or reopens it.
+  """
+
+  def __init__(self, name: str, timeout: float = 0):
+    self.name = name
+    self.max_slow_call = timeout * _SLOW_CALL_RATIO
+    self.slow_call = self.max_slow_call
+    self._results = deque(maxlen=max(_WINDOW, 1))
+    self._state = BreakerState.CLOSED
+    self._opened_at = 0.0
+    self._trial_running = False
+    self._lock = threading.Lock()
+
+  def isOpen(self) -> bool:
+    """
+    True while calls are rejected without a trial (half-open isnt open)
+    """
+    with self._lock:
+      return self._state == BreakerState.OPEN and time.monotonic() - self._opened_at < _OPEN_TIME
+
+  def state(self) -> BreakerState:
+    with self._lock:
+      if self._state == BreakerState.OPEN and time.monotonic() - self._opened_at >= _OPEN_TIME:
+        return BreakerState.HALF_OPEN
+      return self._state
+
+  def acquire(self):
+    with self._lock:
+      if self._state == BreakerState.OPEN:
+        if time.monotonic() - self._opened_at < _OPEN_TIME:
+          raise CircuitOpenError(f"{self.name} circuit is open")
+        self._state = BreakerState.HALF_OPEN
+        self._trial_running = False
+      if self._state == BreakerState.HALF_OPEN:
+        if self._trial_running:
+          raise CircuitOpenError(f"{self.name} circuit is half-open and its trial call is running")
+        self._trial_running = True
+
+  def record(self, success: bool, elapsed: float = 0):
+    slow = self.slow_call > 0 and elapsed > self.slow_call
+    ok = success and not slow
+    with self._lock:
+      if self._state == BreakerState.OPEN and time.monotonic() - self._opened_at >= _OPEN_TIME:
+        # a call (e.g. an availability probe) made without acquire serves as trial
+        self._state = BreakerState.HALF_OPEN
+      if self._state == BreakerState.HALF_OPEN:
+        self._trial_running = False
+        if ok:
+          self._state = BreakerState.CLOSED
+          self._results.clear()
+          logger.info(f"{self.name} trial call succeeded => circuit closed")
+        else:
+          self._open(f"trial call {'was slow' if success else 'failed'}")
+        return
+
+      self._results.append(ok)
+      if self._state == BreakerState.CLOSED and len(self._results) >= _MIN_CALLS:
+        failures = self._results.count(False)
+        if failures / len(self._results) >= _ERROR_RATE:
+          self._open(f"{failures} of the last {len(self._results)} calls failed or were slow")
+
+  def adjustSlowCall(self, probe_latency: float):
+    if self.max_slow_call <= 0 or _SLOW_CALL_PROBE_FACTOR <= 0:
+      return
+    slow_call = min(self.max_slow_call, max(probe_latency * _SLOW_CALL_PROBE_FACTOR, _SLOW_CALL_MIN))
+    if abs(slow_call - self.slow_call) >= 0.01:
+      logger.debug(f"{self.name} slow call threshold {self.slow_call:.3f}s => {slow_call:.3f}s")
+    self.slow_call = slow_call
+
+  def trip(self):
+    with self._lock:
+      self._open("tripped")
+
+  def _open(self, reason: str):
+    self._state = BreakerState.OPEN
+    self._opened_at = time.monotonic()
+    self._trial_running = False
+    logger.warning(f"{self.name} {reason} => circuit opened for {_OPEN_TIME}s")
+
+  @contextmanager
+  def guard(self, bulk: bool = False):
+    """
+    Wraps one call to the source: rejects it while the circuit is open and records its outcome.
+    The duration of bulk calls isnt checked against the slow call threshold.
+    """
+    self.acquire()
+    start = time.monotonic()
+    try:
+      yield
+    except Exception as e:
+      self.record(not _isBackendFailure(e), 0 if bulk else time.monotonic() - start)
+      raise
+    self.record(True, 0 if bulk else time.monotonic() - start)
+
+def _isBackendFailure(e: Exception) -> bool:
+  # a 404 for an unknown id is an answer, only server errors and throttling count as failures
+  status_code = getattr(e, 'status_code', None)
+  return status_code is None or status_code >= 500 or status_code == 429
@@ -1,17 +1,55 @@
+import logging
+import os
 from typing import Tuple
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text, inspect
+from sqlalchemy import event, text, inspect
 
 db = SQLAlchemy()
+logger = logging.getLogger(__name__)
+
+# WAL lets readers continue while a writer is active, NORMAL is safe with WAL
+_SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('KT_SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('KT_SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': os.environ.get('KT_SQLITE_BUSY_TIMEOUT', '5000'),
+    'cache_size': os.environ.get('KT_SQLITE_CACHE_SIZE', '-16000'),
+    'mmap_size': os.environ.get('KT_SQLITE_MMAP_SIZE', '67108864'),
+}
 
 def init_db(app):
     # Initialisiere die SQLAlchemy-Erweiterung
     db.init_app(app)
+    with app.app_context():
+        event.listen(db.engine, 'connect', _set_sqlite_pragmas)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in _SQLITE_PRAGMAS.items():
+            if value is None or value == '':
+                continue
+            try:
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+            except Exception as e:
+                logger.error(f"Exception setting PRAGMA {pragma} = {value}: {e}")
+    finally:
+        cursor.close()
+
+def optimize_db(app):
+    """
+    Lets sqlite update the statistics of the query planner, where they are outdated.
+    """
+    try:
+        with app.app_context():
+            db.session.execute(text("PRAGMA optimize"))
+            db.session.commit()
+    except Exception as e:
+        logger.error(f"Exception during PRAGMA optimize: {e}")
 
 def create_all(app):
     with app.app_context():
         # Alle Modelle bekannt machenm, damit diese angelegt werden
-        from api.models.db import GenreSelection, MovieVote, Overlays, ProviderSelection, User, VotingSession
+        from api.models.db import GenreSelection, MovieEntry, MovieVote, Overlays, ProviderSelection, User, VotingSession
         from api.models import Vote, MovieSource, MovieProvider, DiscoverSortBy
         db.create_all()
 
@@ -69,6 +107,8 @@ def check_db(app) -> Tuple[set[str],list[str]]:
                 tables_with_errors.add(table_name)
                 for col in type_mismatches:
                     errors.append(f"Type mismatch in table {table_name}, column {col}: expected {model_col_dict[col]}, found {db_col_dict[col]}")
+            if table_name not in tables_with_errors:
+                errors.extend(_check_indexes(model))
 
     return tables_with_errors, errors
         
@@ -78,4 +118,57 @@ def _normalize_type(type_name):
         return "string"
     if "enum" in type_name:
         return "string"
-    return type_name
\ No newline at end of file
+    return type_name
+
+def _check_indexes(model) -> list[str]:
+    """
+    Creates the indexes of the model, which are missing in the database
+    (create_all only creates them together with a new table).
+    The sqlite master table is used, because the inspector skips expression indexes.
+    """
+    errors = []
+    table_name = model.__tablename__
+    db_indexes = {row[0] for row in select("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table_name", {'table_name': table_name})}
+    for index in model.__table__.indexes:
+        if index.name in db_indexes:
+            continue
+        try:
+            index.create(bind=db.engine)
+            logger.info(f"created missing index {index.name} on table {table_name}")
+        except Exception as e:
+            errors.append(f"Missing index {index.name} on table {table_name}: {e}")
+    return errors
+
+def check_query_plans(app) -> list[str]:
+    """
+    Checks with EXPLAIN QUERY PLAN, that the hot queries are served by an index.
+    Returns a warning for every query, which scans a whole table or index.
+    """
+    from sqlalchemy import func
+    from api.models.db.User import User
+    from api.models.db.VotingSession import VotingSession
+    from api.routes.session import LAST_USER_VOTE_QUERY
+    from api.scoreboard import LOAD_VOTES_QUERY
+
+    def _compile(query) -> str:
+        return str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+
+    warnings = []
+    with app.app_context():
+        queries = {
+            'scoreboard votes': (LOAD_VOTES_QUERY, {'session_id': 0}),
+            'last user vote': (LAST_USER_VOTE_QUERY, {'session_id': 0, 'user_id': 0}),
+            'movie entries': ("SELECT movie_source, movie_id FROM movie_entry WHERE session_id = :session_id ORDER BY position", {'session_id': 0}),
+            'user by name': (_compile(User.query.filter(func.lower(User.name) == 'name')), {}),
+            'session by name': (_compile(VotingSession.query.filter(func.lower(VotingSession.name) == 'name')), {}),
+        }
+        for name, (query, parameters) in queries.items():
+            scans = _full_scans(query, parameters)
+            if len(scans) > 0:
+                warnings.append(f"Query '{name}' does a full table scan: {'; '.join(scans)}")
+    return warnings
+
+def _full_scans(query, parameters={}) -> list[str]:
+    # rows are (id, parent, notused, detail), a search is reported as "SEARCH <table> ...",
+    # a walk over a whole table or index as "SCAN <table> [USING [COVERING] INDEX ...]"
+    return [row[3] for row in select("EXPLAIN QUERY PLAN " + query, parameters) if row[3].startswith('SCAN')]
@@ -0,0 +1,24 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+def getInt(name: str, default: int) -> int:
+  try:
+    return int(os.environ.get(name, str(default)))
+  except ValueError:
+    logger.error(f"Invalid {name} value! Using default {default}.")
+    return default
+
+def getFloat(name: str, default: float) -> float:
+  try:
+    return float(os.environ.get(name, str(default)))
+  except ValueError:
+    logger.error(f"Invalid {name} value! Using default {default}.")
+    return default
+
+def getBool(name: str, default: bool) -> bool:
+  value = os.environ.get(name)
+  if value is None or value.strip() == '':
+    return default
+  return value.strip().lower() in ['true', '1', 'yes', 'on']
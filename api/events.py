@@ -0,0 +1,85 @@
+import json
+import logging
+import queue
+import threading
+
+from api import env
+
+logger = logging.getLogger(__name__)
+
+_SSE_MAX_CLIENTS = env.getInt('KT_SSE_MAX_CLIENTS', 50)
+_SSE_HEARTBEAT = env.getInt('KT_SSE_HEARTBEAT', 15)
+_SSE_QUEUE_SIZE = 100
+
+class Subscription:
+
+  def __init__(self, session_id: int|None):
+    self.session_id = session_id
+    self.queue = queue.Queue(maxsize=_SSE_QUEUE_SIZE)
+
+class EventHub:
+  """
+  Pushes session events (session-created, user-joined, vote, match) to
+  subscribed Server-Sent-Events clients. Events with a session id only go to the
+  subscribers of that session, events without one go to all subscribers.
+  The number of subscribers is limited by KT_SSE_MAX_CLIENTS,
+  clients beyond that limit have to fall back to polling.
+  """
+
+  _instance = None
+  _instance_lock = threading.Lock()
+
+  def __new__(cls, *args, **kwargs):
+    with cls._instance_lock:
+      if cls._instance is None:
+        instance = super(EventHub, cls).__new__(cls)
+        instance._lock = threading.Lock()
+        instance._subscriptions = set()
+        cls._instance = instance
+    return cls._instance
+
+  def subscribe(self, session_id: int|None) -> Subscription|None:
+    with self._lock:
+      if len(self._subscriptions) >= _SSE_MAX_CLIENTS:
+        logger.warning(f"max number of {_SSE_MAX_CLIENTS} event subscribers reached => rejecting subscriber")
+        return None
+      subscription = Subscription(session_id)
+      self._subscriptions.add(subscription)
+      return subscription
+
+  def unsubscribe(self, subscription: Subscription):
+    with self._lock:
+      self._subscriptions.discard(subscription)
+
+  def publish(self, event: str, data: dict, session_id: int|None = None):
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    with self._lock:
+      subscriptions = list(self._subscriptions)
+    for subscription in subscriptions:
+      if session_id is not None and subscription.session_id != session_id:
+        continue
+      try:
+        subscription.queue.put_nowait(message)
+      except queue.Full:
+        # client doesnt read anymore; it will be dropped with the next heartbeat
+        logger.debug(f"event queue of subscriber for session {subscription.session_id} is full => dropping {event}")
+
+  def stream(self, subscription: Subscription):
+    try:
+      yield f"retry: {_SSE_HEARTBEAT * 1000}\n\n"
+      while True:
+        try:
+          yield subscription.queue.get(timeout=_SSE_HEARTBEAT)
+        except queue.Empty:
+          # comments keep the connection open and let us notice gone clients
+          yield ": heartbeat\n\n"
+    finally:
+      self.unsubscribe(subscription)
+
+  def subscriberCount(self) -> int:
+    with self._lock:
+      return len(self._subscriptions)
+
+  @staticmethod
+  def getInstance() -> 'EventHub':
+    return EventHub()
@@ -1,21 +1,124 @@
-from concurrent.futures import ThreadPoolExecutor
-import os
+from concurrent.futures import Future
+from enum import Enum
+import heapq
+import itertools
+import logging
+import queue
+import threading
 import time
 
+from api import env
+
+logger = logging.getLogger(__name__)
+
+class Lane(Enum):
+    # latency critical work, a user is waiting for
+    FOREGROUND = "foreground"
+    # prefetching, periodic checks, ...
+    BACKGROUND = "background"
+
+class QueueFullError(RuntimeError):
+    pass
+
+class _WorkerLane:
+    """
+    Worker threads with an own bounded priority queue (lower priority value runs first).
+    """
+
+    def __init__(self, lane: Lane, workers: int, max_queue: int):
+        self.lane = lane
+        self._queue = queue.PriorityQueue(maxsize=max(max_queue, 0))
+        self._sequence = itertools.count()
+        for number in range(max(workers, 1)):
+            thread = threading.Thread(target=self._work, name=f"{lane.value}-{number}", daemon=True)
+            thread.start()
+
+    def submit(self, priority: int, method, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            self._queue.put_nowait((priority, next(self._sequence), future, method, args, kwargs))
+        except queue.Full:
+            logger.warning(f"{self.lane.value} queue is full => rejecting {getattr(method, '__name__', method)}")
+            future.set_exception(QueueFullError(f"{self.lane.value} queue is full"))
+        return future
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            _, _, future, method, args, kwargs = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(method(*args, **kwargs))
+            except BaseException as e:
+                logger.error(f"Exception during {self.lane.value} task {getattr(method, '__name__', method)}: {e}")
+                future.set_exception(e)
+
+class Scheduler:
+    """
+    Foreground and background worker lanes plus one timer thread for periodic jobs.
+    Background work (like prefetching) never occupies a foreground worker,
+    and periodic jobs dont occupy a worker while waiting for their next run.
+    """
+
+    def __init__(self):
+        self._lanes = {
+            Lane.FOREGROUND: _WorkerLane(Lane.FOREGROUND,
+                                         env.getInt('KT_EXECUTOR_WORKERS', 5),
+                                         env.getInt('KT_EXECUTOR_QUEUE_SIZE', 1000)),
+            Lane.BACKGROUND: _WorkerLane(Lane.BACKGROUND,
+                                         env.getInt('KT_EXECUTOR_BACKGROUND_WORKERS', 2),
+                                         env.getInt('KT_EXECUTOR_BACKGROUND_QUEUE_SIZE', 100)),
+        }
+        self._timers = []
+        self._timers_sequence = itertools.count()
+        self._timers_condition = threading.Condition()
+        threading.Thread(target=self._timer, name='scheduler-timer', daemon=True).start()
+
+    def submit(self, method, *args, **kwargs) -> Future:
+        return self._lanes[Lane.FOREGROUND].submit(0, method, *args, **kwargs)
+
+    def submitBackground(self, method, *args, priority: int = 0, **kwargs) -> Future:
+        return self._lanes[Lane.BACKGROUND].submit(priority, method, *args, **kwargs)
+
+    def schedule(self, interval: int, method, *args, lane: Lane = Lane.BACKGROUND):
+        """
+        Runs method every interval seconds (first run immediately) in the given lane.
+        A run is skipped, if the previous one is still running.
+        """
+        with self._timers_condition:
+            heapq.heappush(self._timers, (time.monotonic(), next(self._timers_sequence), interval, lane, method, args, None))
+            self._timers_condition.notify()
+
+    def queueDepth(self, lane: Lane) -> int:
+        return self._lanes[lane].depth()
+
+    def _timer(self):
+        while True:
+            with self._timers_condition:
+                while len(self._timers) == 0 or self._timers[0][0] > time.monotonic():
+                    timeout = self._timers[0][0] - time.monotonic() if len(self._timers) > 0 else None
+                    self._timers_condition.wait(timeout)
+                due, _, interval, lane, method, args, running = heapq.heappop(self._timers)
+                if running is None or running.done():
+                    running = self._lanes[lane].submit(0, method, *args)
+                else:
+                    logger.debug(f"{getattr(method, '__name__', method)} still running => skipping this run")
+                heapq.heappush(self._timers, (max(due + interval, time.monotonic()), next(self._timers_sequence), interval, lane, method, args, running))
+
 class ExecutorManager:
     _instance = None
+    _instance_lock = threading.Lock()
 
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = ThreadPoolExecutor(max_workers=int(os.environ.get('KT_EXECUTOR_WORKERS', '5')))
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = Scheduler()
 
         return cls._instance
-    
+
     @staticmethod
     def repeat(interval: int, method, *args):
-        def _repeat():
-            while True:
-                method(*args)
-                time.sleep(interval) 
-
-        ExecutorManager().submit(_repeat)
\ No newline at end of file
+        ExecutorManager().schedule(interval, method, *args)
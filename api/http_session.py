@@ -0,0 +1,43 @@
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from api import env
+
+logger = logging.getLogger(__name__)
+
+def create(name: str) -> requests.Session:
+  """
+  Creates a long-lived, pooled session for the given client name.
+  Defaults (KT_HTTP_POOL_SIZE, KT_HTTP_RETRIES, KT_HTTP_BACKOFF, KT_HTTP_KEEP_ALIVE)
+  can be overwritten per client, e.g. KT_TMDB_HTTP_POOL_SIZE.
+  """
+  prefix = f"KT_{name.upper()}_HTTP_"
+  pool_size = env.getInt(prefix + 'POOL_SIZE', env.getInt('KT_HTTP_POOL_SIZE', 10))
+  retries = env.getInt(prefix + 'RETRIES', env.getInt('KT_HTTP_RETRIES', 2))
+  backoff = env.getFloat(prefix + 'BACKOFF', env.getFloat('KT_HTTP_BACKOFF', 0.3))
+  keep_alive = env.getBool(prefix + 'KEEP_ALIVE', env.getBool('KT_HTTP_KEEP_ALIVE', True))
+
+  # Only connection problems and gateway errors are retried (and only for idempotent methods).
+  # Read timeouts arent retried, a hung server would multiply the timeout of every call.
+  # Everything else (401, 404, 429, ...) is up to the caller.
+  retry = Retry(
+    total=retries,
+    connect=retries,
+    read=0,
+    status=retries,
+    backoff_factor=backoff,
+    status_forcelist=[502, 503, 504],
+    raise_on_status=False)
+  adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+  session = requests.Session()
+  session.mount('http://', adapter)
+  session.mount('https://', adapter)
+  if not keep_alive:
+    session.headers['Connection'] = 'close'
+
+  logger.debug(f"created http session {name} with pool size {pool_size}, {retries} retries, backoff {backoff}, keep alive {keep_alive}")
+  return session
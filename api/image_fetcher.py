@@ -2,28 +2,36 @@ from io import BytesIO
 import logging
 import os
 
-import requests
 import platform
 
+from api import http_session
 from api.models.Poster import Poster
+from api.negative_cache import NegativeCache
 
 
 logger = logging.getLogger(__name__)
 
 _SMB_USER = os.environ.get('KT_SMB_USER', 'samba')
 _SMB_PASSWORD = os.environ.get('KT_SMB_PASSWORD', 'samba')
+_SESSION = http_session.create('image')
+# image urls, which returned 404
+_MISSING_IMAGES = NegativeCache('missing_image', 5000, 3600, 7 * 86400)
 
 def fetch_http_image(image_url: str, headers = None) -> Poster|None:
   if image_url is None or image_url == '':
       return None
+  if _MISSING_IMAGES.isBlocked(image_url):
+    logger.debug(f"skipping image url {image_url}, which returned 404 before")
+    return None
 
   try:
     if headers is None:
-      response = requests.get(image_url)
+      response = _SESSION.get(image_url)
     else:
-      response = requests.get(image_url, headers=headers)
+      response = _SESSION.get(image_url, headers=headers)
 
     if response.status_code == 200:
+      _MISSING_IMAGES.hit(image_url)
       image_data = BytesIO(response.content)
       paths = image_url.split("/")
       offset = 1
@@ -37,6 +45,7 @@ def fetch_http_image(image_url: str, headers = None) -> Poster|None:
       # return encoded_data.decode('utf-8')
     elif response.status_code == 404:
       logger.debug(f"no (more) image found at {image_url} (returned 404)")
+      _MISSING_IMAGES.miss(image_url)
     return None
 
   except Exception as e:
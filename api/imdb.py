@@ -1,14 +1,14 @@
 import logging
 import os
 
-import requests
-
+from api import http_session
 from api.image_fetcher import fetch_http_image
 from api.models.Poster import Poster
 
 logger = logging.getLogger(__name__)
 
 _OMDB_API_KEY = os.environ.get('KT_OMDB_API_KEY', '-')
+_SESSION = http_session.create('omdb')
 
 def get_poster_by_id(imdb_id) -> Poster|None:
   global _OMDB_API_KEY
@@ -17,7 +17,7 @@ def get_poster_by_id(imdb_id) -> Poster|None:
 
   logger.debug(f"try to receive image from imdb id ...")
   url = f"http://www.omdbapi.com/?i={imdb_id}&apikey={_OMDB_API_KEY}"
-  response = requests.get(url)
+  response = _SESSION.get(url)
 
   if response.status_code == 200:
     data = response.json()
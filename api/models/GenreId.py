@@ -52,6 +52,15 @@ class GenreId:
             "sources": self._ids_to_sources()
         }
 
+    @staticmethod
+    def from_dict(data: dict) -> 'GenreId':
+        return GenreId(data['name'],
+                       kodi_id=data.get('kodi_id'),
+                       tmdb_id=data.get('tmdb_id'),
+                       emby_id=data.get('emby_id'),
+                       jellyfin_id=data.get('jellyfin_id'),
+                       plex_id=data.get('plex_id'))
+
     def _ids_to_sources(self) -> List[str]:
         sources = []
         if self.kodi_id is not None:
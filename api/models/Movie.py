@@ -3,6 +3,7 @@ from typing import List
 
 from .MovieProvider import MovieProvider
 from api.models.MovieProvider import providerToDict
+from api.models.MovieProvider import fromString as mp_fromString
 from .GenreId import GenreId
 from .MovieId import MovieId
 
@@ -75,6 +76,7 @@ class Movie:
         return {
             "movie_id": self.movie_id.to_dict(),
             "title": self.title,
+            "original_title": self.original_title,
             "plot": self.plot,
             "year": self.year,
             "runtime": self.runtime,
@@ -91,6 +93,25 @@ class Movie:
             }
         }
 
+    @staticmethod
+    def from_dict(data: dict) -> 'Movie':
+        movie = Movie(
+            MovieId.from_dict(data['movie_id']),
+            data['title'],
+            data['plot'],
+            data['year'],
+            [GenreId.from_dict(g) for g in data['genres']],
+            data['runtime'],
+            data['age'],
+            data['playcount'])
+        movie.set_original_title(data.get('original_title'))
+        movie.uniqueid = dict(data['uniqueid'])
+        movie.set_thumbnail(data['thumbnail'])
+        movie.add_providers([mp_fromString(p['name']) for p in data['provider']])
+        movie.add_youtube_trailer_ids(data['trailer'])
+        movie.set_rating(data['rating']['average'], data['rating']['count'])
+        return movie
+
     def __repr__(self) -> str:
         return '<Movie> : ' + self.__str__()
 
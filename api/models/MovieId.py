@@ -14,6 +14,10 @@ class MovieId:
             "language": self.language
         }
 
+    @staticmethod
+    def from_dict(data: dict) -> 'MovieId':
+        return MovieId(MovieSource(data['source']), data['id'], data['language'])
+
     def __repr__(self) -> str:
         return '<MovieId> : ' + self.__str__()
 
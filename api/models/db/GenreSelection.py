@@ -1,5 +1,6 @@
 import logging
 from api.database import db
+from api.session_config import SessionConfig
 from sqlalchemy import Enum as ForeignKey, func
 
 from ..Vote import Vote
@@ -35,6 +36,7 @@ class GenreSelection(db.Model):
         new_selection = GenreSelection(genre_id=genre_id, session_id=session_id, vote=vote)
         db.session.add(new_selection)
         db.session.commit()
+        SessionConfig.invalidate(session_id)
         return new_selection
    
     @staticmethod
@@ -12,21 +12,26 @@ logger = logging.getLogger(__name__)
 
 class MovieEntry(db.Model):
     __tablename__ = 'movie_entry'
+    __table_args__ = (
+        db.Index('ix_movie_entry_session_position', 'session_id', 'position', 'movie_source', 'movie_id'),
+    )
 
     id: int = db.Column(db.Integer, primary_key=True, autoincrement=True)
     session_id: int = db.Column(db.Integer, ForeignKey('voting_session.id', ondelete='CASCADE'))
     movie_source: MovieSource = db.Column(db.Enum(MovieSource), nullable=False)
     movie_id: str  = db.Column(db.String(64), nullable=False)
+    position: int = db.Column(db.Integer, nullable=False, default=0)
 
     # session = relationship("VotingSession", backref="movie_votes")
 
-    def __init__(self, session: VotingSession, movie_source: MovieSource, movie_id: str):
+    def __init__(self, session: VotingSession, movie_source: MovieSource, movie_id: str, position: int = 0):
         self.session_id = session.id
         self.movie_source = movie_source
         self.movie_id = movie_id
+        self.position = position
 
     def __repr__(self):
-        return f'<MovieEntry id={self.id}, session_id={self.session_id}, movie_source={self.movie_source}, movie_id={self.movie_id}'
+        return f'<MovieEntry id={self.id}, session_id={self.session_id}, movie_source={self.movie_source}, movie_id={self.movie_id}, position={self.position}'
 
     @staticmethod
     def create(session: VotingSession, movie_source: MovieSource, movie_id: str) -> 'MovieEntry':
@@ -35,6 +40,24 @@ class MovieEntry(db.Model):
         db.session.commit()
         return new_entry
     
+    @staticmethod
+    def createAll(session_id: int, movies: list[tuple[MovieSource, str]]):
+        """
+        Stores the (movie_source, movie_id) list of a session with its order in one transaction
+        """
+        db.session.bulk_insert_mappings(MovieEntry, [{
+            'session_id': session_id,
+            'movie_source': movie_source,
+            'movie_id': str(movie_id),
+            'position': position
+        } for position, (movie_source, movie_id) in enumerate(movies)])
+        db.session.commit()
+
     @staticmethod
     def list(session_id: int) -> list['MovieEntry']:
-        return MovieEntry.query.filter_by(session_id = session_id).all()
\ No newline at end of file
+        return MovieEntry.query.filter_by(session_id = session_id).order_by(MovieEntry.position).all()
+
+    @staticmethod
+    def delete(session_id: int):
+        MovieEntry.query.filter_by(session_id = session_id).delete()
+        db.session.commit()
\ No newline at end of file
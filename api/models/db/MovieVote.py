@@ -12,6 +12,12 @@ logger = logging.getLogger(__name__)
 
 class MovieVote(db.Model):
     __tablename__ = 'movie_vote'
+    __table_args__ = (
+        # covers the scoreboard load (all votes of a session in order of voting)
+        db.Index('ix_movie_vote_session_date', 'session_id', 'vote_date', 'user_id', 'movie_source', 'movie_id', 'vote'),
+        # covers the lookup of the last vote of a user in a session
+        db.Index('ix_movie_vote_session_user_date', 'session_id', 'user_id', 'vote_date', 'movie_source', 'movie_id'),
+    )
 
     user_id: int = db.Column(db.Integer, ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
     movie_source: MovieSource = db.Column(db.Enum(MovieSource), nullable=False, primary_key=True)
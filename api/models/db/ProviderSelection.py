@@ -1,5 +1,6 @@
 import logging
 from api.database import db
+from api.session_config import SessionConfig
 from sqlalchemy import Enum as ForeignKey
 
 from api.models.MovieProvider import MovieProvider
@@ -32,6 +33,7 @@ class ProviderSelection(db.Model):
         new_provider = ProviderSelection(session_id=session_id, provider=provider)
         db.session.add(new_provider)
         db.session.commit()
+        SessionConfig.invalidate(session_id)
         return new_provider
    
     @staticmethod
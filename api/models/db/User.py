@@ -51,4 +51,7 @@ class User(db.Model):
     
     @staticmethod
     def list():
-        return User.query.all()
\ No newline at end of file
+        return User.query.all()
+
+# serves the case insensitive lookup by name
+db.Index('ix_user_name_lower', func.lower(User.name))
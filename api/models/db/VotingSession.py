@@ -15,6 +15,8 @@ from api.models.MovieProvider import MovieProvider
 from api.models.db.ProviderSelection import ProviderSelection
 from api.models.Vote import Vote
 from api.models.MovieProvider import providerToString
+from api.scoreboard import Scoreboard
+from api.session_config import SessionConfig
 
 logger = logging.getLogger(__name__)
 
@@ -32,14 +34,6 @@ class VotingSession(db.Model):
     overlays_id: int|None = db.Column(db.Integer, db.ForeignKey('overlays.id', ondelete='SET NULL'), nullable=True)
     tmdb_discover_id: int|None = db.Column(db.Integer, db.ForeignKey('tmdb_discover.id', ondelete='SET NULL'), nullable=True)
 
-    forced_genre_ids = None
-    disabled_genre_ids = None
-    movie_provider = None
-    misc_filter = None
-    overlays = None
-    end_conditions = None
-    tmdb_discover = None
-
     def __init__(self,
                  name: str,
                  creator_id: int,
@@ -89,54 +83,36 @@ class VotingSession(db.Model):
         
         return datetime.now(timezone.utc) - self.start_date.replace(tzinfo=timezone.utc) > timedelta(minutes=endConditions.max_minutes)
 
+    def _config(self) -> SessionConfig|None:
+        return SessionConfig.get(self.id)
+
     def getDisabledGenres(self) -> List[int]:
-        if self.disabled_genre_ids is None:
-            disabled_genres = GenreSelection.list(self.id)
-            genre_ids = []
-            for genre in disabled_genres:
-                if genre.vote == Vote.CONTRA:
-                    genre_ids.append(genre.genre_id)
-            self.disabled_genre_ids = genre_ids
-        return self.disabled_genre_ids
+        config = self._config()
+        return list(config.disabled_genre_ids) if config is not None else []
     
     def getMustGenres(self) -> List[int]:
-        if self.forced_genre_ids is None:
-            forced_genres = GenreSelection.list(self.id)
-            genre_ids = []
-            for genre in forced_genres:
-                if genre.vote == Vote.PRO:
-                    genre_ids.append(genre.genre_id)
-            self.forced_genre_ids = genre_ids
-        return self.forced_genre_ids
+        config = self._config()
+        return list(config.must_genre_ids) if config is not None else []
 
     def getMovieProvider(self) -> List[MovieProvider]:
-        if self.movie_provider is None:
-            providers = ProviderSelection.list(self.id)
-            provider_list = []
-            for provider in providers:
-                provider_list.append(provider.provider)
-            self.movie_provider = provider_list
-        return self.movie_provider
+        config = self._config()
+        return list(config.movie_provider) if config is not None else []
 
     def getMiscFilter(self) -> MiscFilter|None:
-        if self.misc_filter is None and self.misc_filter_id is not None:
-            self.misc_filter = MiscFilter.get(self.misc_filter_id)
-        return self.misc_filter
+        config = self._config()
+        return config.misc_filter if config is not None else None
 
     def getOverlays(self) -> Overlays|None:
-        if self.overlays is None and self.overlays_id is not None:
-            self.overlays = Overlays.get(self.overlays_id)
-        return self.overlays
+        config = self._config()
+        return config.overlays if config is not None else None
     
     def getEndConditions(self) -> EndConditions|None:
-        if self.end_conditions is None and self.end_conditions_id is not None:
-            self.end_conditions = EndConditions.get(self.end_conditions_id)
-        return self.end_conditions
+        config = self._config()
+        return config.end_conditions if config is not None else None
 
     def getTmdbDiscover(self) -> TMDBDiscover|None:
-        if self.tmdb_discover is None and self.tmdb_discover_id is not None:
-            self.tmdb_discover = TMDBDiscover.get(self.tmdb_discover_id)
-        return self.tmdb_discover
+        config = self._config()
+        return config.tmdb_discover if config is not None else None
 
     def getLanguage(self) -> str:
         discover = self.getTmdbDiscover()
@@ -160,30 +136,49 @@ class VotingSession(db.Model):
                                     tmdb_discover_id= discover.id if discover else None)
         db.session.add(new_session)
         db.session.commit()
+        SessionConfig.invalidate(new_session.id)
         return new_session
 
     @staticmethod
     def get(sessionIdOrName: int|str) -> 'VotingSession|None':
         if isinstance(sessionIdOrName, int):
-            return VotingSession.query.get(sessionIdOrName)
+            config = SessionConfig.get(sessionIdOrName)
+            return config.session if config is not None else None
         elif isinstance(sessionIdOrName, str):
-            return VotingSession.query.filter(func.lower(VotingSession.name) == str(sessionIdOrName).lower()).first()
+            session_id = SessionConfig.idByName(sessionIdOrName)
+            if session_id is not None:
+                session = VotingSession.get(session_id)
+                if session is not None and session.name.lower() == sessionIdOrName.lower():
+                    return session
+            session_id = db.session.query(VotingSession.id).filter(func.lower(VotingSession.name) == str(sessionIdOrName).lower()).scalar()
+            return VotingSession.get(session_id) if session_id is not None else None
         raise Exception('sessionIdOrName must be int (id) or str (name)!')
 
     @staticmethod
     def list() -> List['VotingSession']:
-        return VotingSession.query.all()
+        result = []
+        for row in db.session.query(VotingSession.id).all():
+            session = VotingSession.get(row[0])
+            if session is not None:
+                result.append(session)
+        return result
 
     @staticmethod
     def delete(session_id: int) -> 'VotingSession|None':
-        session = VotingSession.get(session_id)
+        session = VotingSession.query.get(session_id)
         if session:
-            overlays = session.getOverlays()
-            if overlays:
-                Overlays.delete(overlays.id)
-            end_conditions = session.getEndConditions()
-            if end_conditions:
-                EndConditions.delete(end_conditions.id)
+            if session.overlays_id is not None:
+                Overlays.delete(session.overlays_id)
+            if session.end_conditions_id is not None:
+                EndConditions.delete(session.end_conditions_id)
             db.session.delete(session)
             db.session.commit()
-        return session
\ No newline at end of file
+            # imported here, because MovieEntry imports VotingSession
+            from api.models.db.MovieEntry import MovieEntry
+            MovieEntry.delete(session_id)
+            SessionConfig.invalidate(session_id)
+            Scoreboard.drop(session_id)
+        return session
+
+# serves the case insensitive lookup by name
+db.Index('ix_voting_session_name_lower', func.lower(VotingSession.name))
@@ -0,0 +1,120 @@
+import json
+import logging
+import time
+
+from api import env
+from api.cache_db import CacheDb
+from api.models.Movie import Movie
+from api.models.MovieId import MovieId
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE = env.getFloat('KT_CACHE_DB_MAX_AGE', 7) * 86400
+_MAX_MOVIES = env.getInt('KT_CACHE_DB_MOVIE_SIZE', 20000)
+
+class MovieStore:
+  """
+  Write-through persistent store for builded movies (and raw source data),
+  so a restart doesnt have to fetch every movie again from all sources.
+  Entries older than KT_CACHE_DB_MAX_AGE days are expired, only the newest
+  KT_CACHE_DB_MOVIE_SIZE movies are kept.
+  """
+
+  _instance = None
+
+  def __new__(cls, *args, **kwargs):
+    if cls._instance is None:
+      instance = super(MovieStore, cls).__new__(cls)
+      instance._db = CacheDb.getInstance()
+      instance._db.execute("""
+        CREATE TABLE IF NOT EXISTS movie (
+          movie_key TEXT PRIMARY KEY,
+          data TEXT NOT NULL,
+          stored_at REAL NOT NULL
+        )""")
+      instance._db.execute("""
+        CREATE TABLE IF NOT EXISTS source_data (
+          source TEXT NOT NULL,
+          data_key TEXT NOT NULL,
+          data TEXT NOT NULL,
+          stored_at REAL NOT NULL,
+          PRIMARY KEY (source, data_key)
+        )""")
+      instance.purge()
+      cls._instance = instance
+    return cls._instance
+
+  def get(self, movie_id: MovieId) -> tuple[Movie,float]|None:
+    """
+    Returns the stored movie and its age in seconds
+    """
+    rows = self._db.select("SELECT data, stored_at FROM movie WHERE movie_key = ? AND stored_at >= ?", (str(movie_id), self._expiry()))
+    if len(rows) <= 0:
+      return None
+
+    try:
+      return Movie.from_dict(json.loads(rows[0][0])), max(time.time() - rows[0][1], 0)
+    except Exception as e:
+      logger.error(f"Exception during restoring movie {movie_id} from store => ignoring stored movie: {e}")
+      self.delete(movie_id)
+      return None
+
+  def put(self, movie: Movie):
+    try:
+      data = json.dumps(movie.to_dict())
+    except (TypeError, ValueError) as e:
+      logger.error(f"Movie {movie.movie_id} could not be serialized => not stored: {e}")
+      return
+
+    self._db.execute("INSERT OR REPLACE INTO movie (movie_key, data, stored_at) VALUES (?, ?, ?)",
+                     (str(movie.movie_id), data, time.time()))
+
+  def delete(self, movie_id: MovieId):
+    self._db.execute("DELETE FROM movie WHERE movie_key = ?", (str(movie_id), ))
+
+  def getSourceData(self, source: str, key: str) -> dict|None:
+    rows = self._db.select("SELECT data FROM source_data WHERE source = ? AND data_key = ? AND stored_at >= ?",
+                           (source, key, self._expiry()))
+    if len(rows) <= 0:
+      return None
+
+    try:
+      return json.loads(rows[0][0])
+    except ValueError as e:
+      logger.error(f"Exception during restoring {source} data {key} from store => ignoring stored data: {e}")
+      return None
+
+  def putSourceData(self, source: str, key: str, data: dict):
+    try:
+      serialized = json.dumps(data)
+    except (TypeError, ValueError) as e:
+      logger.error(f"{source} data {key} could not be serialized => not stored: {e}")
+      return
+
+    self._db.execute("INSERT OR REPLACE INTO source_data (source, data_key, data, stored_at) VALUES (?, ?, ?, ?)",
+                     (source, key, serialized, time.time()))
+
+  def deleteSourceData(self, source: str, key: str):
+    self._db.execute("DELETE FROM source_data WHERE source = ? AND data_key = ?", (source, key))
+
+  def purge(self):
+    """
+    Removes expired entries and the oldest movies above the size limit.
+    """
+    expiry = self._expiry()
+    self._db.execute("DELETE FROM movie WHERE stored_at < ?", (expiry, ))
+    self._db.execute("DELETE FROM source_data WHERE stored_at < ?", (expiry, ))
+    if _MAX_MOVIES > 0:
+      self._db.execute("""
+        DELETE FROM movie WHERE movie_key NOT IN (
+          SELECT movie_key FROM movie ORDER BY stored_at DESC LIMIT ?
+        )""", (_MAX_MOVIES, ))
+
+  def _expiry(self) -> float:
+    if _MAX_AGE <= 0:
+      return 0.0
+    return time.time() - _MAX_AGE
+
+  @staticmethod
+  def getInstance() -> 'MovieStore':
+    return MovieStore()
@@ -0,0 +1,41 @@
+import logging
+import threading
+import time
+
+from api import env
+from api.cache import Cache
+
+logger = logging.getLogger(__name__)
+
+class NegativeCache:
+  """
+  Remembers failed lookups (missing movies, posters, ...), so they are skipped for a while.
+  A key is skipped for KT_CACHE_<NAME>_BACKOFF seconds after its first miss, the time doubles
+  with every further miss up to KT_CACHE_<NAME>_BACKOFF_MAX. A hit forgets the misses.
+  The number of remembered keys is limited by KT_CACHE_<NAME>_SIZE.
+  """
+
+  def __init__(self, name: str, max_size: int = 1000, backoff: int = 300, backoff_max: int = 86400):
+    self.name = name
+    self.backoff = env.getInt(f"KT_CACHE_{name.upper()}_BACKOFF", backoff)
+    self.backoff_max = env.getInt(f"KT_CACHE_{name.upper()}_BACKOFF_MAX", backoff_max)
+    # key -> (number of misses, skipped until)
+    self._misses = Cache(name, max_size)
+    self._lock = threading.Lock()
+
+  def isBlocked(self, key) -> bool:
+    entry = self._misses.get(key)
+    return entry is not None and time.monotonic() < entry[1]
+
+  def miss(self, key):
+    if self.backoff <= 0:
+      return
+    with self._lock:
+      entry = self._misses.get(key)
+      misses = entry[0] + 1 if entry is not None else 1
+      delay = min(self.backoff * 2 ** (misses - 1), max(self.backoff_max, self.backoff))
+      self._misses.set(key, (misses, time.monotonic() + delay))
+    logger.debug(f"{self.name}: miss {misses} for {key} => skipping it for {delay}s")
+
+  def hit(self, key):
+    self._misses.pop(key)
@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import os
+import threading
+
+from api.cache_db import CacheDb
+from api.models.MovieId import MovieId
+from api.models.MovieSource import MovieSource
+from api.models.Poster import Poster
+
+logger = logging.getLogger(__name__)
+
+_CACHE_DIR = os.environ.get('KT_CACHE_FOLDER', '/cache')
+_CACHE_URL = 'static/images/cache/'
+_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp', '.gif', '.tbn']
+
+class PosterStore:
+  """
+  Poster cache with content addressed files (<hash[:2]>/<hash><extension>)
+  and an in-memory index MovieId -> file, which is persisted in the cache db.
+  Same posters (e.g. for different languages) are stored only once.
+  """
+
+  _instance = None
+  _instance_lock = threading.Lock()
+
+  def __new__(cls, *args, **kwargs):
+    with cls._instance_lock:
+      if cls._instance is None:
+        instance = super(PosterStore, cls).__new__(cls)
+        instance._lock = threading.Lock()
+        instance._db = CacheDb.getInstance()
+        instance._db.execute("""
+          CREATE TABLE IF NOT EXISTS poster_index (
+            movie_key TEXT PRIMARY KEY,
+            blob TEXT NOT NULL
+          )""")
+        instance._index = {row[0]: row[1] for row in instance._db.select("SELECT movie_key, blob FROM poster_index")}
+        instance._importLegacyFiles()
+        cls._instance = instance
+    return cls._instance
+
+  def get(self, movie_id: MovieId) -> str|None:
+    for key in self._keys(movie_id):
+      blob = self._index.get(key)
+      if blob is None:
+        continue
+      if os.path.isfile(self._path(blob)):
+        return _CACHE_URL + blob
+      logger.debug(f"cached poster {blob} for {key} was deleted => removing it from index")
+      self._unindex(key)
+    return None
+
+  def store(self, movie_id: MovieId, poster: Poster) -> str|None:
+    digest = hashlib.sha256(poster.data).hexdigest()
+    blob = digest[:2] + '/' + digest + poster.extension
+    path = self._path(blob)
+    try:
+      if not os.path.isfile(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.' + str(threading.get_ident()) + '.tmp'
+        with open(tmp, 'wb') as imageFile:
+          imageFile.write(poster.data)
+        os.replace(tmp, path)
+    except Exception as e:
+      logger.error(f"Exception during storing poster for movie {movie_id} : {e}")
+      return None
+
+    for key in self._keys(movie_id):
+      self._indexBlob(key, blob)
+    return _CACHE_URL + blob
+
+  def isAvailable(self, url: str|None) -> bool:
+    if url is None:
+      return False
+    return os.path.isfile(self._path(url.replace(_CACHE_URL, '', 1)))
+
+  def _keys(self, movie_id: MovieId) -> list[str]:
+    # Posters of media servers dont depend on the language, tmdb posters may do
+    keys = [str(movie_id)]
+    if movie_id.source != MovieSource.TMDB:
+      keys.append(str(movie_id.source.name) + ':' + str(movie_id.id))
+    return keys
+
+  def _path(self, blob: str) -> str:
+    return _CACHE_DIR + '/' + blob
+
+  def _indexBlob(self, key: str, blob: str):
+    with self._lock:
+      self._index[key] = blob
+    self._db.execute("INSERT OR REPLACE INTO poster_index (movie_key, blob) VALUES (?, ?)", (key, blob))
+
+  def _unindex(self, key: str):
+    with self._lock:
+      self._index.pop(key, None)
+    self._db.execute("DELETE FROM poster_index WHERE movie_key = ?", (key, ))
+
+  def _importLegacyFiles(self):
+    # Posters of older versions are stored as <MovieId><extension> directly in the cache dir
+    try:
+      entries = list(os.scandir(_CACHE_DIR))
+    except OSError as e:
+      logger.error(f"Cache dir {_CACHE_DIR} not readable: {e}")
+      return
+
+    imported = 0
+    for entry in entries:
+      key, extension = os.path.splitext(entry.name)
+      if not entry.is_file() or extension.lower() not in _IMAGE_EXTENSIONS or ':' not in key:
+        continue
+      try:
+        with open(entry.path, 'rb') as imageFile:
+          data = imageFile.read()
+        digest = hashlib.sha256(data).hexdigest()
+        blob = digest[:2] + '/' + digest + extension
+        os.makedirs(os.path.dirname(self._path(blob)), exist_ok=True)
+        os.replace(entry.path, self._path(blob))
+        self._indexBlob(key, blob)
+        imported += 1
+      except Exception as e:
+        logger.error(f"Exception during import of cached poster {entry.name}: {e}")
+
+    if imported > 0:
+      logger.info(f"imported {imported} posters from the old cache layout")
+
+  @staticmethod
+  def getInstance() -> 'PosterStore':
+    return PosterStore()
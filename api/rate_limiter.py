@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+  """
+  Thread safe token bucket: allows rate requests per second on average and bursts of up to burst requests.
+  Callers without a token wait (queue) for one instead of failing. pause() stops handing out
+  tokens for a while, e.g. for the Retry-After of a 429 answer.
+  Keeps statistics about the requests and how long they waited.
+  """
+
+  def __init__(self, name: str, rate: float, burst: int):
+    self.name = name
+    self.rate = rate
+    self.burst = max(burst, 1)
+    self._tokens = float(self.burst)
+    self._updated = time.monotonic()
+    self._paused_until = 0.0
+    self._lock = threading.Lock()
+    self._requests = 0
+    self._waited = 0
+    self._wait_total = 0.0
+    self._wait_max = 0.0
+    self._throttled = 0
+
+  def acquire(self) -> float:
+    """
+    Takes one token, waits until one is available. Returns the seconds waited.
+    """
+    if self.rate <= 0:
+      return 0.0
+
+    start = time.monotonic()
+    with self._lock:
+      now = time.monotonic()
+      self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+      self._updated = now
+      # the token is reserved right away (tokens may get negative), so waiting callers keep their order
+      self._tokens -= 1
+      ready_at = max(now + max(-self._tokens, 0) / self.rate, self._paused_until)
+
+    delay = ready_at - time.monotonic()
+    if delay > 0:
+      time.sleep(delay)
+    waited = time.monotonic() - start
+
+    with self._lock:
+      self._requests += 1
+      if delay > 0:
+        self._waited += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+    if delay > 1:
+      logger.debug(f"{self.name} request waited {waited:.2f}s for the rate limit")
+    return waited
+
+  def pause(self, seconds: float):
+    with self._lock:
+      self._throttled += 1
+      self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+    logger.warning(f"{self.name} rate limit hit => pausing requests for {seconds}s")
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        'requests': self._requests,
+        'waited': self._waited,
+        'wait_total': round(self._wait_total, 3),
+        'wait_max': round(self._wait_max, 3),
+        'wait_avg': round(self._wait_total / self._waited, 3) if self._waited > 0 else 0.0,
+        'throttled': self._throttled,
+      }
@@ -1,17 +1,22 @@
 import logging
-import os
-from pathlib import Path
-from typing import Dict, List
+from typing import List
 from flask import Blueprint, jsonify
 
 from api import imdb
+from api import session_filter
+from api.cache import Cache
+from api.circuit_breaker import StatusCodeError
 from api.models.GenreId import GenreId
-from api.models.Poster import Poster
+from api.movie_store import MovieStore
+from api.negative_cache import NegativeCache
+from api.poster_store import PosterStore
+from api.single_flight import SingleFlight
 from api.sources.emby import Emby
 from api.sources.jellyfin import Jellyfin
 from api.sources.kodi import Kodi
 from api.sources.tmdb import Tmdb
 from api.sources.plex import Plex
+from api.sources.source import Source
 from api.models.Movie import Movie
 from api.models.MovieId import MovieId
 from api.models.MovieSource import MovieSource
@@ -22,10 +27,13 @@ logger = logging.getLogger(__name__)
 
 bp = Blueprint('movie', __name__)
 
-_CACHE_DIR = os.environ.get('KT_CACHE_FOLDER', '/cache')
-
-_MOVIE_MAP: Dict[MovieId, Movie] = {}
-_GENRES_BY_LANGUAGE = {}
+# stale movies (e.g. with an old playcount) are refreshed in the background
+_MOVIE_MAP = Cache('movie', 5000, soft_ttl=3600)
+_MOVIE_FETCHES = SingleFlight('movie')
+_GENRES_BY_LANGUAGE = Cache('genres', 0, soft_ttl=86400)
+# movies no source could deliver and movies without any poster
+_MISSING_MOVIES = NegativeCache('missing_movie', 5000, 300, 86400)
+_MISSING_POSTERS = NegativeCache('missing_poster', 5000, 3600, 7 * 86400)
 
 @bp.route('/api/v1/movie/get/<movie_source>/<movie_id>/<language>', methods=['GET'])
 def get(movie_source: str, movie_id: str, language: str):
@@ -143,7 +151,7 @@ def play(movie_source: str, movie_id: str, language: str):
   if msrc == MovieSource.KODI:
     result = Kodi.getInstance().playMovie(int(movie_source))
   else:
-    kodi_modie_id = Kodi.getInstance().getMovieIdByTitleYear(set([movie.title, movie.original_title]), movie.year)
+    kodi_modie_id = Kodi.getInstance().getMovieIdByTitleYear(set([movie.title, movie.original_title]), movie.year, movie.uniqueid)
     if kodi_modie_id > 0:
       result = Kodi.getInstance().playMovie(kodi_modie_id)
     return {"error": f"dont know how to play {movieId}"}, 400
@@ -152,30 +160,93 @@ def play(movie_source: str, movie_id: str, language: str):
 
 def getMovie(movie_id: MovieId) -> tuple[Movie,bool]|tuple[None,bool]:
   global _MOVIE_MAP
-  if movie_id in _MOVIE_MAP:
+  movie = _MOVIE_MAP.get(movie_id, Cache.MISSING)
+  if movie is not Cache.MISSING:
     logger.debug(f"getting builded movie with id {movie_id} from cache")
-    movie = _MOVIE_MAP.get(movie_id, None)
     if movie is None:
       return None, False
+    if _MOVIE_MAP.isStale(movie_id):
+      _MOVIE_MAP.refresh(movie_id, _refreshMovie, movie_id)
     return movie, True
 
+  stored = MovieStore.getInstance().get(movie_id)
+  if stored is not None:
+    stored, age = stored
+    if stored.thumbnail is None or PosterStore.getInstance().isAvailable(stored.thumbnail):
+      logger.debug(f"getting builded movie with id {movie_id} from store")
+      # the movie is as old as in the store, so an old playcount gets refreshed
+      _MOVIE_MAP.set(movie_id, stored, age)
+      if _MOVIE_MAP.isStale(movie_id):
+        _MOVIE_MAP.refresh(movie_id, _refreshMovie, movie_id)
+      return stored, True
+
+  if _MISSING_MOVIES.isBlocked(movie_id):
+    logger.debug(f"skipping movie with id {movie_id}, which wasnt found before")
+    return None, False
+
+  # concurrent callers (voters, prefetching) for the same movie share one fetch
+  return _MOVIE_FETCHES.do(movie_id, _fetchMovie, movie_id)
+
+def _fetchMovie(movie_id: MovieId) -> tuple[Movie,bool]|tuple[None,bool]:
+  movie = _MOVIE_MAP.get(movie_id, Cache.MISSING)
+  if movie is not Cache.MISSING:
+    # another caller finished fetching this movie in the meantime
+    return movie, movie is not None
+  return _loadMovie(movie_id)
+
+def _refreshMovie(movie_id: MovieId) -> Movie|object:
+  # the sources keep their own copies, which would be returned again
   if movie_id.source == MovieSource.KODI:
-    result = Kodi.getInstance().getMovieById(movie_id.id, movie_id.language)
+    Kodi.getInstance().dropImportedMovie(movie_id)
   elif movie_id.source == MovieSource.TMDB:
-    result = Tmdb.getInstance().getMovieById(movie_id.id, movie_id.language)
-  elif movie_id.source == MovieSource.EMBY:
-    result = Emby.getInstance().getMovieById(movie_id.id, movie_id.language)
-  elif movie_id.source == MovieSource.JELLYFIN:
-    result = Jellyfin.getInstance().getMovieById(movie_id.id, movie_id.language)
-  elif movie_id.source == MovieSource.PLEX:
-    result = Plex.getInstance().getMovieById(movie_id.id, movie_id.language)
-  else:
+    Tmdb.getInstance().dropMovieData(movie_id.id, movie_id.language)
+  movie, _ = _loadMovie(movie_id)
+  if movie is None:
+    # keep the stale movie, if it couldnt be fetched
+    return Cache.MISSING
+  session_filter.updateMovie(movie)
+  return movie
+
+def _getSource(movie_source: MovieSource) -> Source|None:
+  if movie_source == MovieSource.KODI:
+    return Kodi.getInstance()
+  elif movie_source == MovieSource.TMDB:
+    return Tmdb.getInstance()
+  elif movie_source == MovieSource.EMBY:
+    return Emby.getInstance()
+  elif movie_source == MovieSource.JELLYFIN:
+    return Jellyfin.getInstance()
+  elif movie_source == MovieSource.PLEX:
+    return Plex.getInstance()
+  return None
+
+def _loadMovie(movie_id: MovieId) -> tuple[Movie,bool]|tuple[None,bool]:
+  source = _getSource(movie_id.source)
+  if source is None:
     logger.error(f"{movie_id.source} is not a known MovieSource!")
     return None, False
 
+  # only a not found answer of the source is remembered as missing,
+  # not a disabled source, an open circuit or a failed request
+  if source.isApiDisabled():
+    logger.debug(f"{movie_id.source} not available => movie with id {movie_id} not loaded")
+    return None, False
+  try:
+    result = source.getMovieById(movie_id.id, movie_id.language)
+  except StatusCodeError as e:
+    if e.status_code != 404:
+      logger.error(f"Exception {e} during loading movie with id {movie_id}")
+      return None, False
+    result = None
+  except Exception as e:
+    logger.error(f"Exception {e} during loading movie with id {movie_id}")
+    return None, False
+
   if result is None:
     logger.error(f"movie with id {movie_id} not found!")
+    _MISSING_MOVIES.miss(movie_id)
     return None, False
+  _MISSING_MOVIES.hit(movie_id)
 
   if movie_id.source != MovieSource.TMDB and 'tmdb' in result.uniqueid:
     Tmdb.getInstance().setTrailerIds(result)
@@ -184,23 +255,25 @@ def getMovie(movie_id: MovieId) -> tuple[Movie,bool]|tuple[None,bool]:
       for provider in tmdbMovie.provider:
         result.add_provider(provider)
   elif movie_id.source == MovieSource.TMDB:
-    kodiId = Kodi.getInstance().getMovieIdByTitleYear(set([result.title, result.original_title]), result.year)
+    kodiId = Kodi.getInstance().getMovieIdByTitleYear(set([result.title, result.original_title]), result.year, result.uniqueid)
     if kodiId > 0:
       result.add_provider(MovieProvider.KODI)
-    jellyfinId = Jellyfin.getInstance().getMovieIdByTitleYear(set([result.title, result.original_title]), result.year)
+    jellyfinId = Jellyfin.getInstance().getMovieIdByTitleYear(set([result.title, result.original_title]), result.year, result.uniqueid)
     if jellyfinId is not None:
       result.add_provider(MovieProvider.JELLYFIN)
-    embyId = Emby.getInstance().getMovieIdByTitleYear(set([result.title, result.original_title]), result.year)
+    embyId = Emby.getInstance().getMovieIdByTitleYear(set([result.title, result.original_title]), result.year, result.uniqueid)
     if embyId > 0:
       result.add_provider(MovieProvider.EMBY)
-    plexId = Plex.getInstance().getMovieIdByTitleYear(set([result.title, result.original_title]), result.year)
+    plexId = Plex.getInstance().getMovieIdByTitleYear(set([result.title, result.original_title]), result.year, result.uniqueid)
     if plexId > 0:
       result.add_provider(MovieProvider.PLEX)
 
-  localImageUrl = _checkImage(movie_id)
+  localImageUrl = PosterStore.getInstance().get(movie_id)
   if localImageUrl is not None:
     logger.debug(f"using cached image for movie {movie_id} ...")
     result.set_thumbnail(localImageUrl)
+  elif _MISSING_POSTERS.isBlocked(movie_id):
+    logger.debug(f"skipping poster lookup for movie {movie_id}, which had no poster before")
   else:
     poster = None
     for fetcher, uri in result.thumbnail_sources:
@@ -215,28 +288,16 @@ def getMovie(movie_id: MovieId) -> tuple[Movie,bool]|tuple[None,bool]:
 
     # finaly store the image on disc and set url in result
     if poster is not None:
-      result.set_thumbnail(_storeImage(poster, movie_id))
+      result.set_thumbnail(PosterStore.getInstance().store(movie_id, poster))
+      _MISSING_POSTERS.hit(movie_id)
+    else:
+      _MISSING_POSTERS.miss(movie_id)
 
-  _MOVIE_MAP[movie_id] = result
+  _MOVIE_MAP.set(movie_id, result)
+  MovieStore.getInstance().put(result)
 
   return result, False
 
-def _checkImage(movie_id: MovieId) -> str|None:
-  global _CACHE_DIR
-  path = Path(_CACHE_DIR)
-  file = next((file for file in path.glob(f"{movie_id}.*")), None)  
-  return 'static/images/cache/' + file.name if file else None
-
-def _storeImage(poster: Poster, movie_id: MovieId) -> str | None:
-  global _CACHE_DIR
-  try:
-    with open(_CACHE_DIR + '/' + str(movie_id) + poster.extension, 'wb') as imageFile:
-      imageFile.write(poster.data)
-    return 'static/images/cache/' + str(movie_id) + poster.extension
-  except Exception as e:
-    logger.error(f"Exception during _storeImage for movie {movie_id} : {e}")
-    return None
-
 @bp.route('/api/v1/movie/providers/<region>', methods=['GET'])
 def providers(region: str):
   """
@@ -310,18 +371,16 @@ def genres(language: str):
   return jsonify(genres), 200
 
 def list_genres(language: str) -> List[GenreId]:
-  global _GENRES_BY_LANGUAGE
-  if not language in _GENRES_BY_LANGUAGE:
-    genres = []
-    _merge_genres(genres, Kodi.getInstance().listGenres(language))
-    _merge_genres(genres, Tmdb.getInstance().listGenres(language))
-    _merge_genres(genres, Emby.getInstance().listGenres(language))
-    _merge_genres(genres, Jellyfin.getInstance().listGenres(language))
-    _merge_genres(genres, Plex.getInstance().listGenres(language))
-    genres = sorted(genres, key=lambda x: x.name)
-    _GENRES_BY_LANGUAGE[language] = genres
-
-  return _GENRES_BY_LANGUAGE.get(language, [])
+  return _GENRES_BY_LANGUAGE.getOrLoad(language, _load_genres, language)
+
+def _load_genres(language: str) -> List[GenreId]:
+  genres = []
+  _merge_genres(genres, Kodi.getInstance().listGenres(language))
+  _merge_genres(genres, Tmdb.getInstance().listGenres(language))
+  _merge_genres(genres, Emby.getInstance().listGenres(language))
+  _merge_genres(genres, Jellyfin.getInstance().listGenres(language))
+  _merge_genres(genres, Plex.getInstance().listGenres(language))
+  return sorted(genres, key=lambda x: x.name)
 
 def _merge_genres(allGenres: List[GenreId], toMergeGenres: List[GenreId]):
     for g in toMergeGenres:
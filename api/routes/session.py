@@ -2,15 +2,18 @@ from datetime import date
 import logging
 import random
 import threading
-from typing import Dict, List, Tuple
+import time
+from typing import List, Tuple
 from flask import Blueprint, Flask, Response, jsonify, request, current_app
 
+from api import env
+from api.cache import Cache
+from api.events import EventHub
 from api.executor import ExecutorManager
 from api.models.db.MiscFilter import MiscFilter
 from api.models.db.EndConditions import EndConditions
 from api.models.db.MovieEntry import MovieEntry
 from api.models.db.Overlays import Overlays
-from api.models.GenreId import GenreId
 from api.models.MovieId import MovieId
 from api.models.MovieProvider import MovieProvider
 from api.models.db.ProviderSelection import ProviderSelection
@@ -24,7 +27,11 @@ from api.models.db.GenreSelection import GenreSelection
 from api.models.db.TMDBDiscover import TMDBDiscover
 from api.models.db.User import User
 from api.models.db.VotingSession import VotingSession
-from api.database import select
+from api.database import db, select
+from api.scoreboard import Scoreboard
+from api.single_flight import SingleFlight
+from api.vote_journal import VoteJournal
+from api import session_filter
 from api.routes import movie
 
 from api.sources.emby import Emby
@@ -37,9 +44,17 @@ logger = logging.getLogger(__name__)
 
 bp = Blueprint('session', __name__)
 
-_SESSION_MOVIELIST_LOCK = threading.Lock()
-_SESSION_MOVIELIST_MAP: Dict[int, list[MovieId]] = {}
-_SESSION_MOVIE_FILTER_RESULT: Dict[str, bool] = {}
+_SESSION_MOVIELIST_BUILDS = SingleFlight('session_movielist')
+_SESSION_MOVIELIST_MAP = Cache('session_movielist', 20)
+# lists, where a provider failed, arent stored and are fetched again after a minute
+_SESSION_MOVIELIST_INCOMPLETE = Cache('session_movielist_incomplete', 20, ttl=60)
+_SESSION_MOVIE_POSITION = Cache('session_movie_position', 20)
+_SESSION_STATUS = Cache('session_status', 100)
+_SESSION_STATUS_LOCK = threading.Lock()
+_SESSION_STATUS_INTERVAL = env.getFloat('KT_SESSION_STATUS_INTERVAL', 1)
+# index of the last movie voted by the user: (session_id, user_id) -> (movie list, index),
+# the index is only valid for the list it was taken from
+_SESSION_USER_CURSOR = Cache('session_user_cursor', 1000)
 
 @bp.route('/api/v1/session/get/<session_id>', methods=['GET'])
 def get(session_id:str):
@@ -490,7 +505,8 @@ def start():
   # In default configuration use_reloader will be True if
   # debugging is enabled!
   app = current_app._get_current_object() # type: ignore
-  ExecutorManager().submit(_prefetch, app, votingsession, 0, 15)
+  ExecutorManager().submitBackground(_prefetch, app, votingsession, 0, 15, priority=1)
+  EventHub.getInstance().publish('session-created', {'session_id': votingsession.id, 'name': votingsession.name, 'creator_id': votingsession.creator_id})
 
   return sessionDict, 200
 
@@ -580,60 +596,151 @@ def status(session_id: str):
   if votingSession is None:
     return jsonify({'error': f"session with id {session_id} not found"}), 404
 
-  result = {
-    'session': votingSession.to_dict(),
-    'user_ids': [],
-    'votes': []
-  }
+  snapshot = _status_snapshot(votingSession)
+  etag = f"{sid}-{snapshot['version']}"
+  if request.if_none_match.contains(etag):
+    notModified = Response(status=304)
+    notModified.set_etag(etag)
+    return notModified
+
+  result = snapshot
+  since = request.args.get('since', type=int)
+  if since is not None and since <= snapshot['version']:
+    result = dict(snapshot)
+    result['since'] = since
+    result['votes'] = [vote for vote in snapshot['votes'] if vote['version'] > since]
+
+  response = jsonify(result)
+  response.set_etag(etag)
+  response.headers['Cache-Control'] = 'no-cache'
+  return response
+
+def _status_snapshot(votingSession: VotingSession) -> dict:
+  # The snapshot is rebuild at most once per interval, no matter how many clients are polling
+  scoreboard = Scoreboard.forSession(votingSession.id)
+  snapshot = _SESSION_STATUS.get(votingSession.id)
+  if snapshot is not None and (snapshot['version'] == scoreboard.version
+                               or time.monotonic() - snapshot['built_at'] < _SESSION_STATUS_INTERVAL):
+    return snapshot['result']
+
+  with _SESSION_STATUS_LOCK:
+    latest = _SESSION_STATUS.get(votingSession.id)
+    if latest is not None and latest is not snapshot:
+      return latest['result']
+
+    version = scoreboard.version
+    result = {
+      'session': votingSession.to_dict(),
+      'version': version,
+      'user_ids': scoreboard.userIds(),
+      'votes': []
+    }
+
+    language = votingSession.getLanguage()
+    for vote in scoreboard.votes():
+      result['votes'].append({
+        'movie_source': vote['movie_source'],
+        'movie_id': {
+            'source': vote['movie_source'],
+            'id': vote['movie_id'],
+            'language': language
+          },
+        'pro_voter': vote['pro_voter'],
+        'con_voter': vote['con_voter'],
+        'voter': vote['voter'],
+        'last_vote': vote['last_vote'],
+        'version': vote['version'],
+      })
+
+    _SESSION_STATUS.set(votingSession.id, {'version': version, 'built_at': time.monotonic(), 'result': result})
+    return result
+
+@bp.route('/api/v1/session/events', methods=['GET'])
+def events():
+  """
+  Server-Sent-Events stream with session events (session-created, user-joined, vote, match)
+  ---
+  parameters:
+    - name: session_id
+      in: query
+      type: integer
+      required: false
+      description: ID of the session you want the events for; without only session-created events are sent
+  responses:
+    200:
+      description: text/event-stream with the events
+    503:
+      description: Too many subscribers; poll instead
+      schema:
+        type: object
+        properties:
+          error:
+            type: string
+            example: too many event subscribers
+  """
+  session_id = request.args.get('session_id', type=int)
+  subscription = EventHub.getInstance().subscribe(session_id)
+  if subscription is None:
+    return jsonify({'error': "too many event subscribers"}), 503
+
+  # The stream only waits on the queue of its subscription; it doesnt hold the app context
+  response = Response(EventHub.getInstance().stream(subscription),
+                      mimetype='text/event-stream',
+                      headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+  response.call_on_close(lambda: EventHub.getInstance().unsubscribe(subscription))
+  return response
+
+@bp.route('/api/v1/session/preview/<session_id>', methods=['GET'])
+def preview(session_id: str):
+  """
+  Count how many of the already fetched movies of the session match its filter
+  ---
+  parameters:
+    - name: session_id
+      in: path
+      type: integer
+      required: true
+      description: ID of the session you want the preview for
+  responses:
+    200:
+      description: Movie counts of the session
+      schema:
+        type: object
+        properties:
+          total:
+            type: integer
+            example: 1000
+          checked:
+            type: integer
+            example: 200
+          matching:
+            type: integer
+            example: 42
+    404:
+      description: No session with given id found
+      schema:
+        type: object
+        properties:
+          error:
+            type: string
+            example: session with id 1 not found
+  """
 
-  user_ids = select("SELECT DISTINCT(user_id) FROM movie_vote WHERE session_id = :session_id", {'session_id': sid})
-  for user_id in user_ids:
-    result['user_ids'].append(user_id[0])
+  try:
+    sid = int(session_id)
+  except ValueError:
+    return jsonify({'error': f"session_id must be int!"}), 400
 
-  votes = select("""
-    SELECT
-      movie_source,
-	    movie_id,
-      GROUP_CONCAT(CASE WHEN vote = 'PRO' THEN user_id END) AS pro_voter,
-      GROUP_CONCAT(CASE WHEN vote = 'CONTRA' THEN user_id END) AS contra_voter,
-      GROUP_CONCAT(user_id) AS voter,
-      MAX(vote_date) AS last_vote
-    FROM
-	    movie_vote
-    WHERE
-	    session_id = :session_id
-    GROUP BY
-	    movie_source, movie_id
-    ORDER BY
-      last_vote DESC
-  """, {'session_id': sid})
-  for vote in votes:
-    pros = []
-    if vote[2] is not None and len(vote[2]) > 0:
-      for uid in vote[2].split(','):
-        pros.append(int(uid))
-    cons = []
-    if vote[3] is not None and len(vote[3]) > 0:
-      for uid in vote[3].split(','):
-        cons.append(int(uid))
-    voter = []
-    if vote[4] is not None and len(vote[4]) > 0:
-      for uid in vote[4].split(','):
-        voter.append(int(uid))
-    result['votes'].append({
-      'movie_source': vote[0],
-      'movie_id': {
-          'source': vote[0],
-          'id': vote[1],
-          'language': votingSession.getLanguage()
-        },
-      'pro_voter': pros,
-      'con_voter': cons,
-      'voter': voter,
-      'last_vote': vote[5],
-    })
+  votingSession = VotingSession.get(sid)
+  if votingSession is None:
+    return jsonify({'error': f"session with id {session_id} not found"}), 404
 
-  return result, 200
+  movies = _get_session_movies(votingSession)
+  sessionFilter, table = session_filter.forSession(votingSession)
+  rows = [row for row in map(table.row, movies) if row is not None]
+  matching = sum(sessionFilter.keep(table, rows))
+
+  return {'total': len(movies), 'checked': len(rows), 'matching': matching}, 200
 
 @bp.route('/api/v1/session/next/<session_id>/<user_id>/<last_movie_source>/<last_movie_id>', methods=['GET'])
 def next_movie(session_id: str, user_id: str, last_movie_source: str, last_movie_id: str):
@@ -702,11 +809,16 @@ def next_movie(session_id: str, user_id: str, last_movie_source: str, last_movie
   language = votingSession.getLanguage()
 
   if last_movie_id == 'none':
-    voted_movies = _user_votes(votingSession, uid)
-    if len(voted_movies) > 0:
-      last_voted = voted_movies[len(voted_movies) - 1]
-      return next_movie(session_id, user_id, str(last_voted.source), str(last_voted.id))
-    index = -1
+    cursor = _SESSION_USER_CURSOR.get((sid, uid))
+    index = cursor[1] if cursor is not None and cursor[0] is movies else None
+    if index is None:
+      last_voted = _last_user_vote(votingSession, uid)
+      if last_voted is None:
+        index = -1
+      else:
+        index = _movie_position(votingSession, movies, last_voted)
+        if index is None:
+          return jsonify({'error': f"movie with id {last_voted} not found in voting list"}), 404
   else:
     try:
       msrc = ms_fromString(last_movie_source)
@@ -714,22 +826,21 @@ def next_movie(session_id: str, user_id: str, last_movie_source: str, last_movie
       return {"error": f"{last_movie_source} is not a valid value for MovieSource"}, 400
 
     movieId = MovieId(msrc, last_movie_id, language)
-
-    try:
-      index = movies.index(movieId)
-    except ValueError:
+    index = _movie_position(votingSession, movies, movieId)
+    if index is None:
       return jsonify({'error': f"movie with id {movieId} not found in voting list"}), 404
-  
-  if index+1 >= len(movies):
+
+  _SESSION_USER_CURSOR.set((sid, uid), (movies, index))
+
+  index += 1
+  while index < len(movies) and _filter_movie(movies[index], votingSession):
+    index += 1
+
+  if index >= len(movies):
     return jsonify({ 'over': "No more movies left!" }), 200
 
-  next_movie_id = movies[index+1]
-  # if next_movie_id <= 0: # this should never happen, because of the previous check?!
-  #   return jsonify({ 'warning': "no more movies left" }), 200
-  
-  if _filter_movie(next_movie_id, votingSession):
-    return next_movie(session_id, user_id, next_movie_id.source.name, str(next_movie_id.id))
- 
+  next_movie_id = movies[index]
+
   result, fromCache = movie.getMovie(next_movie_id)
   if result is None: # this should never happen, because it would mean an illegal next_movie_id
     return jsonify({ 'error': f"next_movie with id {next_movie_id} was None" }), 400
@@ -738,7 +849,7 @@ def next_movie(session_id: str, user_id: str, last_movie_source: str, last_movie
   # In default configuration use_reloader will be True if
   # debugging is enabled!
   app = current_app._get_current_object() # type: ignore
-  ExecutorManager().submit(_prefetch, app, votingSession, index+1, 1)
+  ExecutorManager().submitBackground(_prefetch, app, votingSession, index, 1)
 
   return result.to_dict(), 200
 
@@ -747,280 +858,146 @@ def check_session_end_conditions(votingSession: VotingSession, user: User) -> Tu
     return jsonify({ 'over': "Times up!" }), 200
   
   endConditions = votingSession.getEndConditions()
+  scoreboard = Scoreboard.forSession(votingSession.id)
   max_votes = endConditions.max_votes if endConditions is not None else 0
-  if max_votes > 0 and _count_user_votes(votingSession.id, user.id) >= max_votes:
+  if max_votes > 0 and scoreboard.userVotes(user.id) >= max_votes:
     return jsonify({ 'over': "Max votes reached!" }), 200
   
   max_matches = endConditions.max_matches if endConditions is not None else 0
   if max_matches > 0:
-    user_count = _count_user(votingSession.id)
-    if user_count > 1 and _count_matches(votingSession.id, user_count) >= max_matches:
+    if scoreboard.userCount() > 1 and scoreboard.matches() >= max_matches:
       return jsonify({ 'over': "Max matches reached!" }), 200
 
 def _filter_movie(movie_id: MovieId, votingSession: VotingSession) -> bool :
-  global _SESSION_MOVIE_FILTER_RESULT
-  key = str(votingSession.id) + ':' + str(movie_id)
-  cachedFilterResult = _SESSION_MOVIE_FILTER_RESULT.get(key)
-  if cachedFilterResult is not None:
-    return cachedFilterResult
-
-  disabledGenreIds = votingSession.getDisabledGenres()
-  mustGenreIds = votingSession.getMustGenres()
-  miscFilter = votingSession.getMiscFilter()
-  minAge = miscFilter.min_age if miscFilter is not None else 0
-  maxAge = miscFilter.max_age if miscFilter is not None else 1000
-  minDuration = miscFilter.min_duration if miscFilter is not None else 0
-  maxDuration = miscFilter.max_duration if miscFilter is not None else 14400 # 240(min)*60(sec)
-  minYear = miscFilter.min_year if miscFilter is not None else 1900
-  maxYear = miscFilter.max_year if miscFilter is not None else date.today().year
-  includeWatched = miscFilter.include_watched if miscFilter is not None else True
-  vote_average = miscFilter.vote_average if miscFilter is not None else None
-  vote_count = miscFilter.vote_count if miscFilter is not None else None
-
-  check_movie, _ = movie.getMovie(movie_id)
-  # This shouldnt happen, because then kodi/tmdb would have reported illegal movie ids
-  if check_movie is None:
-    _SESSION_MOVIE_FILTER_RESULT[key] = True
-    return True
-
-  # This can happen if for eample a movie is on Amazon Video (not Prime) but only for buying, 
-  # not for rent. For now we only want flatrates or rents, but no buying
-  # Also this could happen if a movie was checked for kodi presence but kodi is not selected as provider
-  filteredProvider = check_movie.getFilteredProvider(votingSession.getMovieProvider())
-  if len(filteredProvider) <= 0:
-    logger.debug(f"Movie {movie_id} filtered cause of no provider found")
-    _SESSION_MOVIE_FILTER_RESULT[key] = True
-    return True    
-
-  if movie_id.source == MovieSource.TMDB:
-    # Prefere Kodi movies; so if source of this movie isnt kodi,
-    # but kodi is available as provider for this movie and session, skip this movie
-    if MovieProvider.KODI in filteredProvider:
-      logger.debug(f"Movie {movie_id} filtered cause of double match with kodi and kodi is prefered")
-      _SESSION_MOVIE_FILTER_RESULT[key] = True
-      return True
-
-    # Prefere Jellyfin movies; so if source of this movie isnt Jellyfin,
-    # but Jellyfin is available as provider for this movie and session, skip this movie
-    if MovieProvider.JELLYFIN in filteredProvider:
-      logger.debug(f"Movie {movie_id} filtered cause of double match with jellyfin and jellyfin is prefered")
-      _SESSION_MOVIE_FILTER_RESULT[key] = True
-      return True
-
-    # Prefere Emby movies; so if source of this movie isnt emby,
-    # but emby is available as provider for this movie and session, skip this movie
-    if MovieProvider.EMBY in filteredProvider:
-      logger.debug(f"Movie {movie_id} filtered cause of double match with emby and emby is prefered")
-      _SESSION_MOVIE_FILTER_RESULT[key] = True
-      return True
-  
-    # Prefere Plex movies; so if source of this movie isnt plex,
-    # but plex is available as provider for this movie and session, skip this movie
-    if MovieProvider.PLEX in filteredProvider:
-      logger.debug(f"Movie {movie_id} filtered cause of double match with emby and emby is prefered")
-      _SESSION_MOVIE_FILTER_RESULT[key] = True
-      return True
-
-  # No filters apply, so this movie must not be filtered out (can be keept)
-  if len(disabledGenreIds) <= 0 \
-      and len(mustGenreIds) <= 0 \
-      and minAge <= 0 \
-      and maxAge >= 18 \
-      and minDuration <= 0 \
-      and maxDuration > (240*60) \
-      and includeWatched \
-      and minYear <= 1900 \
-      and maxYear >= date.today().year \
-      and vote_average is None \
-      and vote_count is None:
-    _SESSION_MOVIE_FILTER_RESULT[key] = False
-    return False
-
-  if not includeWatched and check_movie.playcount is not None and check_movie.playcount > 0:
-    logger.debug(f"Movie {movie_id} filtered playcount {check_movie.playcount} > 0")
-    _SESSION_MOVIE_FILTER_RESULT[key] = True
-    return True
-
-  if check_movie.runtime is not None and check_movie.runtime > 0 and check_movie.runtime < minDuration:
-    logger.debug(f"Movie {movie_id} filtered cause runtime {check_movie.runtime} < {minDuration}")
-    _SESSION_MOVIE_FILTER_RESULT[key] = True
-    return True
-
-  if check_movie.runtime is not None and check_movie.runtime > maxDuration:
-    logger.debug(f"Movie {movie_id} filtered cause runtime {check_movie.runtime} > {maxDuration}")
-    _SESSION_MOVIE_FILTER_RESULT[key] = True
-    return True
-
-  if check_movie.age is not None and check_movie.age < minAge:
-    logger.debug(f"Movie {movie_id} filtered cause age {check_movie.age} < {minAge}")
-    _SESSION_MOVIE_FILTER_RESULT[key] = True
-    return True
-
-  if check_movie.age is not None and check_movie.age > maxAge:
-    logger.debug(f"Movie {movie_id} filtered cause age {check_movie.age} > {maxAge}")
-    _SESSION_MOVIE_FILTER_RESULT[key] = True
-    return True
-
-  if check_movie.year is not None and check_movie.year > 0 and check_movie.year < minYear:
-    logger.debug(f"Movie {movie_id} filtered cause year {check_movie.year} < {minYear}")
-    _SESSION_MOVIE_FILTER_RESULT[key] = True
-    return True
-  
-  if check_movie.year is not None and check_movie.year > 0 and check_movie.year > maxYear:
-    logger.debug(f"Movie {movie_id} filtered cause year {check_movie.year} > {maxYear}")
-    _SESSION_MOVIE_FILTER_RESULT[key] = True
-    return True
-
-  if check_movie.rating_average is not None and vote_average is not None and check_movie.rating_average < vote_average:
-    logger.debug(f"Movie {movie_id} filtered cause vote_average {check_movie.rating_average} < {vote_average}")
-    _SESSION_MOVIE_FILTER_RESULT[key] = True
-    return True
-  
-  if check_movie.rating_count is not None and vote_count is not None and check_movie.rating_count < vote_count:
-    logger.debug(f"Movie {movie_id} filtered cause vote_count {check_movie.rating_count} < {vote_count}")
-    _SESSION_MOVIE_FILTER_RESULT[key] = True
-    return True
-
-  if _filter_genres(check_movie.genres, disabledGenreIds, mustGenreIds):
-    logger.debug(f"Movie {movie_id} filtered cause genre missmatch")
-    _SESSION_MOVIE_FILTER_RESULT[key] = True
-    return True
-  
-  _SESSION_MOVIE_FILTER_RESULT[key] = False
-  return False
-
-def _filter_genres(movie_genres: List[GenreId], disabledGenreIds: List[int], mustGenreIds: List[int]) -> bool: 
-  # if no genres given, dont filter on them
-  if movie_genres is None or len(movie_genres) <= 0:
-    return False
-
-  mustGenreMatch = False
-  for genre in movie_genres:
-    if genre.id in disabledGenreIds:
+  sessionFilter, table = session_filter.forSession(votingSession)
+  row = table.row(movie_id)
+  if row is None:
+    check_movie, _ = movie.getMovie(movie_id)
+    # This shouldnt happen, because then kodi/tmdb would have reported illegal movie ids
+    if check_movie is None:
       return True
-    if genre.id in mustGenreIds:
-      mustGenreMatch = True
+    row = table.add(check_movie)
 
-  if len(mustGenreIds) > 0 and not mustGenreMatch:
+  if not sessionFilter.keep(table, [row])[0]:
+    logger.debug(f"Movie {movie_id} filtered by filter of session {votingSession.id}")
     return True
-
   return False
 
-
 def _get_session_movies(voting_session: VotingSession) -> List[MovieId]:
-  global _SESSION_MOVIELIST_MAP
-  if voting_session.id in _SESSION_MOVIELIST_MAP:
+  movies = _SESSION_MOVIELIST_MAP.get(voting_session.id, _SESSION_MOVIELIST_INCOMPLETE.get(voting_session.id))
+  if movies is not None:
     logger.debug(f"using cached movie list for session {voting_session.id}")
-    return _SESSION_MOVIELIST_MAP.get(voting_session.id, [])
+    return movies
   else:
-    return _get_session_movies_locked(voting_session)
+    # only callers of the same session wait for a running build
+    return _SESSION_MOVIELIST_BUILDS.do(voting_session.id, _build_session_movies, voting_session)
 
-def _get_session_movies_locked(voting_session: VotingSession) -> List[MovieId]:
-  with _SESSION_MOVIELIST_LOCK:
-    global _SESSION_MOVIELIST_MAP
-    if voting_session.id in _SESSION_MOVIELIST_MAP:
-      return _SESSION_MOVIELIST_MAP.get(voting_session.id, [])
-    else:
-      language = voting_session.getLanguage()
-
-      movies = []
-      entrys = MovieEntry.list(voting_session.id)
-      if entrys is not None and len(entrys) > 0:
-        logger.debug(f"using stored movie list for session {voting_session.id}")
-        for e in entrys:
-          movies.append(MovieId(e.movie_source, e.movie_id, language))
-      else:
-        logger.debug(f"fetching movie list for session {voting_session.id}")
-        random.seed(voting_session.seed)
-        try:
-          tmdb_used = False
-          for provider in voting_session.getMovieProvider():
-            if MovieProvider.KODI == provider:
-              kodiIds = Kodi.getInstance().listMovieIds(voting_session)
-              movies = movies + kodiIds
-            elif MovieProvider.EMBY == provider:
-              embyIds = Emby.getInstance().listMovieIds(voting_session)
-              movies = movies + embyIds
-            elif MovieProvider.JELLYFIN == provider:
-              jellyfinIds = Jellyfin.getInstance().listMovieIds(voting_session)
-              movies = movies + jellyfinIds
-            elif MovieProvider.PLEX == provider:
-              plexIds = Plex.getInstance().listMovieIds(voting_session)
-              movies = movies + plexIds
-            elif provider.useTmdbAsSource():
-              if not tmdb_used:
-                tmdbIds = Tmdb.getInstance().listMovieIds(voting_session)
-                tmdb_used = True
-                movies = movies + tmdbIds
-            else:
-              logger.error(f"Dont know how to fetch movieIds for {provider}; ignoring this provider!")
-          random.shuffle(movies)
-          # for m in movies:
-          #   MovieEntry.create(voting_session, m.source, m.id)
-        except Exception as e:
-          logger.error(f"Exception during fetching movieIds for session {voting_session.id}: {e}")
-
-      _SESSION_MOVIELIST_MAP[voting_session.id] = movies
+def _build_session_movies(voting_session: VotingSession) -> List[MovieId]:
+  movies = _SESSION_MOVIELIST_MAP.get(voting_session.id, _SESSION_MOVIELIST_INCOMPLETE.get(voting_session.id))
+  if movies is not None:
     return movies
 
-def _user_votes(votingSession: VotingSession, user_id: int) -> List[MovieId]:
-  votes = select("""
-      SELECT
-          movie_source, movie_id
-      FROM
-          movie_vote
-      WHERE
-          user_id = :user_id AND session_id = :session_id
-      ORDER BY
-          vote_date
-  """, {'session_id': votingSession.id, 'user_id': user_id})
+  language = voting_session.getLanguage()
 
-  language = votingSession.getLanguage()
-
-  result = []
-  for vote in votes:
-    result.append(MovieId(vote[0], vote[1], language))
-
-  return result
-
-def _count_user_votes(session_id: int, user_id: int) -> int:
-  count = select("""
-      SELECT
-          COUNT(movie_id)
-      FROM
-          movie_vote
-      WHERE
-          user_id = :user_id and session_id = :session_id
-  """, {'session_id': session_id, 'user_id': user_id})
-
-  return int(count[0][0])
-
-def _count_user(session_id: int) -> int:
-  count = select("""
-    SELECT
-        COUNT(DISTINCT(user_id))
-    FROM
-        movie_vote
-    WHERE
-        session_id = :session_id
-  """, {'session_id': session_id})
+  movies = []
+  complete = True
+  entrys = MovieEntry.list(voting_session.id)
+  if entrys is not None and len(entrys) > 0:
+    logger.debug(f"using stored movie list for session {voting_session.id}")
+    for e in entrys:
+      movies.append(MovieId(e.movie_source, e.movie_id, language))
+  else:
+    logger.debug(f"fetching movie list for session {voting_session.id}")
+    app = current_app._get_current_object() # type: ignore
+    # all providers are queried at once, but their results are joined in the configured order,
+    # so the shuffled list is the same for the same seed
+    futures = []
+    tmdb_used = False
+    for provider in voting_session.getMovieProvider():
+      if provider.useTmdbAsSource():
+        if tmdb_used:
+          continue
+        tmdb_used = True
+      futures.append((provider, ExecutorManager().submit(_list_provider_movies, app, voting_session, provider)))
+    for provider, future in futures:
+      try:
+        provided = future.result()
+      except Exception as e:
+        logger.error(f"Exception during fetching movieIds of {provider} for session {voting_session.id}: {e}")
+        provided = None
+      if provided is None:
+        complete = False
+      else:
+        movies = movies + provided
+    random.Random(voting_session.seed).shuffle(movies)
+    if complete:
+      _store_session_movies(voting_session, movies)
+    else:
+      logger.warning(f"Not all providers listed their movies for session {voting_session.id} => movie list isnt stored")
 
-  return int(count[0][0])
+  if complete:
+    _SESSION_MOVIELIST_MAP.set(voting_session.id, movies)
+  else:
+    _SESSION_MOVIELIST_INCOMPLETE.set(voting_session.id, movies)
+  return movies
 
-def _count_matches(session_id: int, user_count: int) -> int:
-  count = select("""
+def _list_provider_movies(app: Flask, voting_session: VotingSession, provider: MovieProvider) -> List[MovieId]|None:
+  with app.app_context():
+    if MovieProvider.KODI == provider:
+      return Kodi.getInstance().listMovieIds(voting_session)
+    elif MovieProvider.EMBY == provider:
+      return Emby.getInstance().listMovieIds(voting_session)
+    elif MovieProvider.JELLYFIN == provider:
+      return Jellyfin.getInstance().listMovieIds(voting_session)
+    elif MovieProvider.PLEX == provider:
+      return Plex.getInstance().listMovieIds(voting_session)
+    elif provider.useTmdbAsSource():
+      return Tmdb.getInstance().listMovieIds(voting_session)
+    logger.error(f"Dont know how to fetch movieIds for {provider}; ignoring this provider!")
+    return []
+
+def _store_session_movies(voting_session: VotingSession, movies: List[MovieId]):
+  # after a restart the list is read back in the same order, instead of fetched and shuffled again
+  if len(movies) <= 0:
+    return
+  try:
+    MovieEntry.createAll(voting_session.id, [(m.source, m.id) for m in movies])
+    logger.debug(f"stored movie list with {len(movies)} movies for session {voting_session.id}")
+  except Exception as e:
+    db.session.rollback()
+    logger.error(f"Exception during storing movie list for session {voting_session.id}: {e}")
+
+def _movie_position(voting_session: VotingSession, movies: List[MovieId], movie_id: MovieId) -> int|None:
+  positions = _SESSION_MOVIE_POSITION.get(voting_session.id)
+  if positions is None or positions[0] is not movies:
+    index = {}
+    for position, m in enumerate(movies):
+      index.setdefault(m, position)
+    positions = (movies, index)
+    _SESSION_MOVIE_POSITION.set(voting_session.id, positions)
+  return positions[1].get(movie_id)
+
+LAST_USER_VOTE_QUERY = """
     SELECT
-        COUNT(user_id) AS pros
+        movie_source, movie_id
     FROM
         movie_vote
     WHERE
-        session_id = :session_id AND vote = 'PRO'
-    GROUP BY
-        movie_source, movie_id
-  """, {'session_id': session_id})
-
-  matches = 0
-  for pros in count:
-    if pros[0] == user_count:
-      matches += 1
-  return matches
\ No newline at end of file
+        user_id = :user_id AND session_id = :session_id
+    ORDER BY
+        vote_date DESC
+    LIMIT 1
+"""
+
+def _last_user_vote(votingSession: VotingSession, user_id: int) -> MovieId|None:
+  # votes still in the vote journal are newer than the stored ones
+  pending = [e for e in VoteJournal.getInstance().pending(votingSession.id) if e['user_id'] == user_id]
+  if len(pending) > 0:
+    last = max(pending, key=lambda e: e['vote_date'])
+    return MovieId(ms_fromString(last['movie_source']), last['movie_id'], votingSession.getLanguage())
+
+  votes = select(LAST_USER_VOTE_QUERY, {'session_id': votingSession.id, 'user_id': user_id})
+
+  if len(votes) <= 0:
+    return None
+  return MovieId(ms_fromString(votes[0][0]), votes[0][1], votingSession.getLanguage())
\ No newline at end of file
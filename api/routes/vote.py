@@ -2,11 +2,13 @@ import logging
 from flask import Blueprint, jsonify, request
 
 from api.models.MovieId import MovieId
-from api.models.db.MovieVote import MovieVote
 from api.models.db.User import User
 from api.models.Vote import Vote
 from api.models.MovieSource import fromString as ms_fromString
 from api.models.db.VotingSession import VotingSession
+from api.events import EventHub
+from api.scoreboard import Scoreboard
+from api.vote_journal import VoteJournal
 from .movie import getMovie
 
 from api.routes.session import check_session_end_conditions, next_movie
@@ -111,8 +113,17 @@ def movie():
   if checkResult is not None:
     return checkResult
 
-  # Deletion is for Undo / Redo last vote
-  MovieVote.delete(session=votingSession, user=user, movie_source=msrc, movie_id=movie_id)
-  MovieVote.create(session=votingSession, user=user, movie_source=msrc, movie_id=movie_id, vote=vote)
+  scoreboard = Scoreboard.forSession(sid)
+  newUser = scoreboard.userVotes(uid) == 0
+  # Stored in the background; a new vote for the same movie replaces the old one (Undo / Redo last vote)
+  vote_date = VoteJournal.getInstance().append(sid, uid, msrc.name, movie_id, vote.name)
+  scoreboard.vote(uid, msrc.name, movie_id, vote.name, Scoreboard.formatDate(vote_date))
+
+  event = {'session_id': sid, 'user_id': uid, 'movie_source': msrc.name, 'movie_id': movie_id, 'version': scoreboard.version}
+  if newUser:
+    EventHub.getInstance().publish('user-joined', event, sid)
+  EventHub.getInstance().publish('vote', dict(event, vote=vote.name.lower()), sid)
+  if vote == Vote.PRO and scoreboard.isMatch(msrc.name, movie_id):
+    EventHub.getInstance().publish('match', event, sid)
   
   return next_movie(session_id, user_id, movie_source, movie_id)
\ No newline at end of file
@@ -0,0 +1,148 @@
+from datetime import datetime
+import logging
+import threading
+import time
+
+from api.cache import Cache
+from api.database import select
+from api.vote_journal import VoteJournal
+
+logger = logging.getLogger(__name__)
+
+_SCOREBOARDS = Cache('scoreboard', 100)
+_SCOREBOARDS_LOCK = threading.Lock()
+
+LOAD_VOTES_QUERY = """
+    SELECT
+        user_id, movie_source, movie_id, vote, vote_date
+    FROM
+        movie_vote
+    WHERE
+        session_id = :session_id
+    ORDER BY
+        vote_date
+"""
+
+class _MovieScore:
+
+  def __init__(self, movie_source: str, movie_id: str):
+    self.movie_source = movie_source
+    self.movie_id = movie_id
+    # user_id -> vote name (PRO / CONTRA), in order of voting
+    self.votes = {}
+    self.last_vote = None
+    # version of the scoreboard, when this movie was voted last
+    self.version = 0
+
+  def pros(self) -> int:
+    return sum(1 for vote in self.votes.values() if vote == 'PRO')
+
+class Scoreboard:
+  """
+  In-memory aggregate of the votes of one session, updated with every vote.
+  Holds the votes per user, the voters and per movie the pro / contra voters,
+  plus a histogram "number of pro votes -> number of movies", so the matches
+  (movies with a pro vote of every voter) can be read without counting.
+  """
+
+  def __init__(self, session_id: int):
+    self.session_id = session_id
+    self._lock = threading.RLock()
+    # starts with the current time, so versions keep increasing when the scoreboard is reloaded
+    self.version = int(time.time() * 1000)
+    self._user_votes = {}
+    self._movies = {}
+    self._pro_histogram = {}
+
+  def vote(self, user_id: int, movie_source: str, movie_id: str, vote: str, vote_date: str|None):
+    with self._lock:
+      key = (movie_source, str(movie_id))
+      score = self._movies.get(key)
+      if score is None:
+        score = _MovieScore(movie_source, str(movie_id))
+        self._movies[key] = score
+
+      pros = score.pros()
+      previous = score.votes.pop(user_id, None)
+      if previous is None:
+        self._user_votes[user_id] = self._user_votes.get(user_id, 0) + 1
+      score.votes[user_id] = vote
+      if vote_date is not None and (score.last_vote is None or vote_date > score.last_vote):
+        score.last_vote = vote_date
+
+      self._moveInHistogram(pros, score.pros())
+      self.version += 1
+      score.version = self.version
+
+  def _moveInHistogram(self, old: int, new: int):
+    if old == new:
+      return
+    if old > 0:
+      self._pro_histogram[old] -= 1
+    if new > 0:
+      self._pro_histogram[new] = self._pro_histogram.get(new, 0) + 1
+
+  def userVotes(self, user_id: int) -> int:
+    return self._user_votes.get(user_id, 0)
+
+  def userCount(self) -> int:
+    return len(self._user_votes)
+
+  def matches(self) -> int:
+    with self._lock:
+      return self._pro_histogram.get(len(self._user_votes), 0)
+
+  def isMatch(self, movie_source: str, movie_id: str) -> bool:
+    with self._lock:
+      score = self._movies.get((movie_source, str(movie_id)))
+      return score is not None and len(self._user_votes) > 1 and score.pros() == len(self._user_votes)
+
+  def userIds(self) -> list[int]:
+    with self._lock:
+      return list(self._user_votes.keys())
+
+  def votes(self) -> list[dict]:
+    """
+    Votes per movie, latest voted movies first
+    """
+    with self._lock:
+      scores = sorted(self._movies.values(), key=lambda s: s.last_vote or '', reverse=True)
+      return [{
+        'movie_source': score.movie_source,
+        'movie_id': score.movie_id,
+        'pro_voter': [uid for uid, vote in score.votes.items() if vote == 'PRO'],
+        'con_voter': [uid for uid, vote in score.votes.items() if vote == 'CONTRA'],
+        'voter': list(score.votes.keys()),
+        'last_vote': score.last_vote,
+        'version': score.version
+      } for score in scores if len(score.votes) > 0]
+
+  def _load(self):
+    votes = select(LOAD_VOTES_QUERY, {'session_id': self.session_id})
+    for vote in votes:
+      self.vote(int(vote[0]), vote[1], vote[2], vote[3], vote[4])
+    # votes not yet written by the vote journal
+    for entry in sorted(VoteJournal.getInstance().pending(self.session_id), key=lambda e: e['vote_date']):
+      self.vote(entry['user_id'], entry['movie_source'], entry['movie_id'], entry['vote'], entry['vote_date'])
+    logger.debug(f"scoreboard of session {self.session_id} loaded with {len(votes)} votes")
+
+  @staticmethod
+  def formatDate(vote_date: datetime|None) -> str|None:
+    # same format as the dates stored by sqlite
+    return vote_date.strftime('%Y-%m-%d %H:%M:%S.%f') if vote_date is not None else None
+
+  @staticmethod
+  def forSession(session_id: int) -> 'Scoreboard':
+    scoreboard = _SCOREBOARDS.get(session_id)
+    if scoreboard is None:
+      with _SCOREBOARDS_LOCK:
+        scoreboard = _SCOREBOARDS.get(session_id)
+        if scoreboard is None:
+          scoreboard = Scoreboard(session_id)
+          scoreboard._load()
+          _SCOREBOARDS.set(session_id, scoreboard)
+    return scoreboard
+
+  @staticmethod
+  def drop(session_id: int):
+    _SCOREBOARDS.pop(session_id)
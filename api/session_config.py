@@ -0,0 +1,116 @@
+import itertools
+import logging
+import threading
+
+from api.cache import Cache
+from api.database import db
+
+logger = logging.getLogger(__name__)
+
+_CONFIGS = Cache('session_config', 200)
+_IDS_BY_NAME = Cache('session_id_by_name', 1000)
+# bumped by invalidate(), a config loaded meanwhile is outdated and not cached
+_GENERATIONS = Cache('session_config_generation', 1000)
+_GENERATION_COUNTER = itertools.count(1)
+_LOCK = threading.Lock()
+
+class SessionConfig:
+  """
+  Immutable configuration of one VotingSession (the session itself, its filters,
+  overlays, end conditions, discover settings, genre and provider selections),
+  loaded with one joined query and cached until the session changes.
+  The contained db objects are detached, so they can be shared between requests.
+  """
+
+  def __init__(self, session, misc_filter, end_conditions, overlays, tmdb_discover,
+               disabled_genre_ids: tuple, must_genre_ids: tuple, movie_provider: tuple):
+    self.session = session
+    self.misc_filter = misc_filter
+    self.end_conditions = end_conditions
+    self.overlays = overlays
+    self.tmdb_discover = tmdb_discover
+    self.disabled_genre_ids = disabled_genre_ids
+    self.must_genre_ids = must_genre_ids
+    self.movie_provider = movie_provider
+    self._frozen = True
+
+  def __setattr__(self, name, value):
+    if getattr(self, '_frozen', False):
+      raise AttributeError(f"SessionConfig is immutable; tried to set {name}")
+    super().__setattr__(name, value)
+
+  @staticmethod
+  def get(session_id: int) -> 'SessionConfig|None':
+    config = _CONFIGS.get(session_id)
+    if config is None:
+      generation = _GENERATIONS.get(session_id)
+      config = SessionConfig._load(session_id)
+      if config is not None:
+        with _LOCK:
+          if _GENERATIONS.get(session_id) == generation:
+            _CONFIGS.set(session_id, config)
+            _IDS_BY_NAME.set(config.session.name.lower(), session_id)
+          else:
+            logger.debug(f"config of session {session_id} changed during loading => not cached")
+    return config
+
+  @staticmethod
+  def idByName(name: str) -> int|None:
+    """
+    Id of a cached session with the given name. May be outdated, the caller has to check the session.
+    """
+    return _IDS_BY_NAME.get(name.lower())
+
+  @staticmethod
+  def invalidate(session_id: int):
+    with _LOCK:
+      _GENERATIONS.set(session_id, next(_GENERATION_COUNTER))
+      config = _CONFIGS.pop(session_id)
+      if config is not None:
+        _IDS_BY_NAME.pop(config.session.name.lower())
+
+  @staticmethod
+  def _load(session_id: int) -> 'SessionConfig|None':
+    from api.models.Vote import Vote
+    from api.models.db.EndConditions import EndConditions
+    from api.models.db.GenreSelection import GenreSelection
+    from api.models.db.MiscFilter import MiscFilter
+    from api.models.db.Overlays import Overlays
+    from api.models.db.ProviderSelection import ProviderSelection
+    from api.models.db.TMDBDiscover import TMDBDiscover
+    from api.models.db.VotingSession import VotingSession
+
+    # genres and providers multiply the rows, but both are only a handful per session
+    rows = db.session.query(VotingSession, MiscFilter, EndConditions, Overlays, TMDBDiscover,
+                            GenreSelection.genre_id, GenreSelection.vote, ProviderSelection.provider) \
+      .outerjoin(MiscFilter, VotingSession.misc_filter_id == MiscFilter.id) \
+      .outerjoin(EndConditions, VotingSession.end_conditions_id == EndConditions.id) \
+      .outerjoin(Overlays, VotingSession.overlays_id == Overlays.id) \
+      .outerjoin(TMDBDiscover, VotingSession.tmdb_discover_id == TMDBDiscover.id) \
+      .outerjoin(GenreSelection, GenreSelection.session_id == VotingSession.id) \
+      .outerjoin(ProviderSelection, ProviderSelection.session_id == VotingSession.id) \
+      .filter(VotingSession.id == session_id) \
+      .all()
+    if len(rows) <= 0:
+      return None
+
+    session, misc_filter, end_conditions, overlays, tmdb_discover = rows[0][:5]
+    disabled_genre_ids = []
+    must_genre_ids = []
+    movie_provider = []
+    for row in rows:
+      genre_id, vote, provider = row[5:]
+      if vote == Vote.CONTRA and genre_id not in disabled_genre_ids:
+        disabled_genre_ids.append(genre_id)
+      elif vote == Vote.PRO and genre_id not in must_genre_ids:
+        must_genre_ids.append(genre_id)
+      if provider is not None and provider not in movie_provider:
+        movie_provider.append(provider)
+
+    for instance in [session, misc_filter, end_conditions, overlays, tmdb_discover]:
+      if instance is not None:
+        db.session.expunge(instance)
+
+    logger.debug(f"loaded config of session {session_id}")
+    return SessionConfig(session, misc_filter, end_conditions, overlays, tmdb_discover,
+                         tuple(disabled_genre_ids), tuple(must_genre_ids), tuple(movie_provider))
@@ -0,0 +1,198 @@
+from array import array
+from datetime import date
+import logging
+import math
+import threading
+
+from api.cache import Cache
+from api.models.Movie import Movie
+from api.models.MovieId import MovieId
+from api.models.MovieProvider import MovieProvider
+from api.models.MovieSource import MovieSource
+from api.models.db.VotingSession import VotingSession
+
+logger = logging.getLogger(__name__)
+
+_PROVIDER_BITS = {provider: 1 << bit for bit, provider in enumerate(MovieProvider)}
+_MEDIA_SERVER_MASK = _PROVIDER_BITS[MovieProvider.KODI] | _PROVIDER_BITS[MovieProvider.JELLYFIN] \
+                   | _PROVIDER_BITS[MovieProvider.EMBY] | _PROVIDER_BITS[MovieProvider.PLEX]
+
+_GENRE_BITS = {}
+_GENRE_BITS_LOCK = threading.Lock()
+
+_SESSION_FILTER = Cache('session_filter_table', 50)
+_SESSION_FILTER_LOCK = threading.Lock()
+
+def _genreBit(genre_id: str) -> int:
+  bit = _GENRE_BITS.get(genre_id)
+  if bit is None:
+    with _GENRE_BITS_LOCK:
+      bit = _GENRE_BITS.setdefault(genre_id, 1 << len(_GENRE_BITS))
+  return bit
+
+def _genreMask(genre_ids) -> int:
+  mask = 0
+  for genre_id in genre_ids:
+    mask |= _genreBit(genre_id)
+  return mask
+
+def _providerMask(providers) -> int:
+  mask = 0
+  for provider in providers:
+    mask |= _PROVIDER_BITS[provider]
+  return mask
+
+class MovieTable:
+  """
+  Columnar table of already builded movies, one row per movie.
+  Missing values are stored as -1 (nan for the rating).
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._rows = {}
+    self.runtime = array('l')
+    self.year = array('l')
+    self.age = array('l')
+    self.playcount = array('l')
+    self.rating = array('d')
+    self.rating_count = array('l')
+    self.tmdb = array('b')
+    self.genres = array('l')
+    self.genre_mask = []
+    self.provider_mask = array('l')
+
+  def row(self, movie_id: MovieId) -> int|None:
+    return self._rows.get(movie_id)
+
+  def add(self, movie: Movie) -> int:
+    with self._lock:
+      row = self._rows.get(movie.movie_id)
+      if row is not None:
+        return row
+
+      for column in self._columns():
+        column.append(0)
+      row = len(self.runtime) - 1
+      self._set(row, movie)
+      self._rows[movie.movie_id] = row
+      return row
+
+  def update(self, movie: Movie):
+    """
+    Overwrites the row of a refreshed movie (e.g. with a new playcount), if the table has one.
+    """
+    with self._lock:
+      row = self._rows.get(movie.movie_id)
+      if row is not None:
+        self._set(row, movie)
+
+  def _columns(self) -> list:
+    return [self.runtime, self.year, self.age, self.playcount, self.rating, self.rating_count,
+            self.tmdb, self.genres, self.genre_mask, self.provider_mask]
+
+  def _set(self, row: int, movie: Movie):
+    self.runtime[row] = self._int(movie.runtime)
+    self.year[row] = self._int(movie.year)
+    self.age[row] = self._int(movie.age)
+    self.playcount[row] = self._int(movie.playcount)
+    self.rating[row] = float(movie.rating_average) if movie.rating_average is not None else math.nan
+    self.rating_count[row] = self._int(movie.rating_count)
+    self.tmdb[row] = 1 if movie.movie_id.source == MovieSource.TMDB else 0
+    self.genres[row] = len(movie.genres) if movie.genres is not None else 0
+    self.genre_mask[row] = _genreMask([g.id for g in movie.genres]) if movie.genres is not None else 0
+    self.provider_mask[row] = _providerMask(movie.provider)
+
+  def _int(self, value) -> int:
+    return int(value) if value is not None else -1
+
+  def __len__(self) -> int:
+    return len(self.runtime)
+
+class SessionFilter:
+  """
+  The filter settings of one VotingSession, compiled once into masks and limits.
+  """
+
+  def __init__(self, votingSession: VotingSession):
+    miscFilter = votingSession.getMiscFilter()
+    self.min_age = miscFilter.min_age if miscFilter is not None else 0
+    self.max_age = miscFilter.max_age if miscFilter is not None else 1000
+    self.min_duration = miscFilter.min_duration if miscFilter is not None else 0
+    self.max_duration = miscFilter.max_duration if miscFilter is not None else 14400 # 240(min)*60(sec)
+    self.min_year = miscFilter.min_year if miscFilter is not None else 1900
+    self.max_year = miscFilter.max_year if miscFilter is not None else date.today().year
+    self.include_watched = miscFilter.include_watched if miscFilter is not None else True
+    self.vote_average = miscFilter.vote_average if miscFilter is not None else None
+    self.vote_count = miscFilter.vote_count if miscFilter is not None else None
+
+    disabledGenreIds = votingSession.getDisabledGenres()
+    mustGenreIds = votingSession.getMustGenres()
+    self.disabled_genres = _genreMask(disabledGenreIds)
+    self.must_genres = _genreMask(mustGenreIds)
+    self.providers = _providerMask(votingSession.getMovieProvider())
+
+    # No filters apply, so only the provider checks are left
+    self.passthrough = len(disabledGenreIds) <= 0 \
+      and len(mustGenreIds) <= 0 \
+      and self.min_age <= 0 \
+      and self.max_age >= 18 \
+      and self.min_duration <= 0 \
+      and self.max_duration > (240*60) \
+      and self.include_watched \
+      and self.min_year <= 1900 \
+      and self.max_year >= date.today().year \
+      and self.vote_average is None \
+      and self.vote_count is None
+
+  def keep(self, table: MovieTable, rows: list[int]) -> list[bool]:
+    """
+    Checks the given rows of the table column by column.
+    Returns for every row if the movie passes the filter (should be keept).
+    """
+    with table._lock:
+      keep = [True] * len(rows)
+      self._apply(keep, rows, table.provider_mask, lambda p, _: p & self.providers != 0)
+      # Prefere media server movies; so if source of this movie is tmdb,
+      # but a media server is available as provider for this movie and session, skip this movie
+      self._apply(keep, rows, table.provider_mask, lambda p, r: not table.tmdb[r] or p & self.providers & _MEDIA_SERVER_MASK == 0)
+      if self.passthrough:
+        return keep
+
+      if not self.include_watched:
+        self._apply(keep, rows, table.playcount, lambda v, _: v <= 0)
+      self._apply(keep, rows, table.runtime, lambda v, _: not (v > 0 and v < self.min_duration) and v <= self.max_duration)
+      self._apply(keep, rows, table.age, lambda v, _: v < 0 or self.min_age <= v <= self.max_age)
+      self._apply(keep, rows, table.year, lambda v, _: v <= 0 or self.min_year <= v <= self.max_year)
+      if self.vote_average is not None:
+        self._apply(keep, rows, table.rating, lambda v, _: not v < self.vote_average)
+      if self.vote_count is not None:
+        self._apply(keep, rows, table.rating_count, lambda v, _: v < 0 or v >= self.vote_count)
+      if self.disabled_genres != 0 or self.must_genres != 0:
+        # if no genres given, dont filter on them
+        self._apply(keep, rows, table.genre_mask, lambda m, r: table.genres[r] <= 0 or (
+          m & self.disabled_genres == 0 and (self.must_genres == 0 or m & self.must_genres != 0)))
+      return keep
+
+  def _apply(self, keep: list[bool], rows: list[int], column, check):
+    for i, row in enumerate(rows):
+      if keep[i]:
+        keep[i] = check(column[row], row)
+
+def forSession(votingSession: VotingSession) -> tuple[SessionFilter, MovieTable]:
+  compiled = _SESSION_FILTER.get(votingSession.id)
+  if compiled is None:
+    with _SESSION_FILTER_LOCK:
+      compiled = _SESSION_FILTER.get(votingSession.id)
+      if compiled is None:
+        logger.debug(f"compiling filter for session {votingSession.id}")
+        compiled = (SessionFilter(votingSession), MovieTable())
+        _SESSION_FILTER.set(votingSession.id, compiled)
+  return compiled
+
+def updateMovie(movie: Movie):
+  """
+  Updates the row of a refreshed movie in the tables of all sessions.
+  """
+  for _, table in _SESSION_FILTER.values():
+    table.update(movie)
@@ -0,0 +1,43 @@
+from concurrent.futures import Future
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+  """
+  Deduplicates concurrent calls for the same key: the first caller executes the call,
+  all others arriving while it is running wait for (and share) its result or exception.
+  """
+
+  def __init__(self, name: str):
+    self.name = name
+    self._calls: dict = {}
+    self._lock = threading.Lock()
+
+  def do(self, key, method, *args):
+    with self._lock:
+      future = self._calls.get(key)
+      leader = future is None
+      if leader:
+        future = Future()
+        self._calls[key] = future
+
+    if not leader:
+      logger.debug(f"{self.name}: waiting for running call for {key}")
+      return future.result()
+
+    try:
+      result = method(*args)
+      future.set_result(result)
+      return result
+    except BaseException as e:
+      future.set_exception(e)
+      raise
+    finally:
+      with self._lock:
+        del self._calls[key]
+
+  def __len__(self) -> int:
+    with self._lock:
+      return len(self._calls)
@@ -2,7 +2,8 @@ import logging
 import math
 import os
 import urllib.parse
-import requests
+from api import env
+from api import http_session
 from api.age_transormer import extract_age_rating
 from api.image_fetcher import fetch_http_image
 from api.models.GenreId import GenreId
@@ -11,6 +12,8 @@ from api.models.MovieId import MovieId
 from api.models.MovieSource import MovieSource
 from api.models.Poster import Poster
 from api.models.db.VotingSession import VotingSession
+from api.title_index import TitleIndex
+from api.circuit_breaker import CircuitBreaker, StatusCodeError
 from .source import Source
 
 class Emby(Source):
@@ -18,15 +21,19 @@ class Emby(Source):
 
   _EMBY_API_KEY = os.environ.get('KT_EMBY_API_KEY', '-')
   _EMBY_URL = os.environ.get('KT_EMBY_URL', 'http://localhost/')
-  _EMBY_TIMEOUT = int(os.environ.get('KT_EMBY_TIMEOUT', '1'))
+  _EMBY_TIMEOUT = env.getInt('KT_EMBY_TIMEOUT', 1)
+  _SESSION = http_session.create('emby')
 
   _QUERY_MOVIES = f"{_EMBY_URL}emby/Items?api_key={_EMBY_API_KEY}&Recursive=true&IncludeItemTypes=Movie"
   _QUERY_MOVIE_BY_ID = f"{_EMBY_URL}emby/Items?Ids=<movie_id>&api_key={_EMBY_API_KEY}&Fields=Genres,ProductionYear,Overview,OfficialRating,CommunityRating,UserRating,VoteCount"
   _QUERY_IMAGE = f"{_EMBY_URL}emby/Items/<itemId>/Images/<imageType>?tag=<imageTag>&api_key={_EMBY_API_KEY}"
   _QUERY_GENRE = f"{_EMBY_URL}emby/Genres?api_key={_EMBY_API_KEY}"
+  _QUERY_MOVIE_TITLES = f"{_EMBY_URL}emby/Items?api_key={_EMBY_API_KEY}&Recursive=true&IncludeItemTypes=Movie&Fields=ProductionYear,OriginalTitle,ProviderIds"
+  _QUERY_SYSTEM_INFO = f"{_EMBY_URL}emby/System/Info?api_key={_EMBY_API_KEY}"
   _QUERY_MOVIE_BY_TITLE_YEAR = f"{_EMBY_URL}emby/Items?api_key={_EMBY_API_KEY}&IncludeItemTypes=Movie&Recursive=true&SearchTerm=<title>&Filters=IsNotFolder&Fields=ProductionYear"
 
   _API_DISABLED = None
+  _BREAKER = CircuitBreaker('emby', _EMBY_TIMEOUT)
 
   _instance = None
 
@@ -46,7 +53,7 @@ class Emby(Source):
               self.logger.warning(f"No Emby API Key / URL set => will be disabled!")
             self._API_DISABLED = True
           else:
-            response = requests.get(self._QUERY_MOVIES, timeout=self._EMBY_TIMEOUT)
+            response = self.probe()
             if response.status_code == 200:
                 self._API_DISABLED = False
                 self.logger.info(f"Emby API reachable => will be enabled!")
@@ -54,13 +61,15 @@ class Emby(Source):
                 self._API_DISABLED = True
                 self.logger.warning(f"Emby API reachable, but API Key invalid => will be disabled!")
             else:
-                self._API_DISABLED = True
-                self.logger.warning(f"Emby API not reachable => will be disabled!")
+                self._API_DISABLED = False
+                self._BREAKER.trip()
+                self.logger.warning(f"Emby API not reachable => circuit opened!")
       except Exception as e:
-          self._API_DISABLED = True
-          self.logger.warning(f"Emby API throwed Exception {e} => will be disabled!")
+          self._API_DISABLED = False
+          self._BREAKER.trip()
+          self.logger.warning(f"Emby API throwed Exception {e} => circuit opened!")
 
-    return self._API_DISABLED
+    return self._API_DISABLED or self._BREAKER.isOpen()
 
   def getMovieById(self, emby_id: int, language: str) -> Movie|None:
     if self.isApiDisabled():
@@ -114,18 +123,18 @@ class Emby(Source):
       url = self._QUERY_IMAGE.replace('<itemId>', str(itemId)).replace('<imageType>', imageType).replace('<imageTag>', imageTag)
       return fetch_http_image(url)
 
-  def listMovieIds(self, votingSession: VotingSession) -> list[MovieId]:
+  def listMovieIds(self, votingSession: VotingSession) -> list[MovieId]|None:
     if self.isApiDisabled():
-      return []
+      return None
 
     language = votingSession.getLanguage()
     try:
-      response = self._make_emby_query(self._QUERY_MOVIES)
+      response = self._make_emby_query(self._QUERY_MOVIES, bulk=True)
       movieIds = [MovieId(MovieSource.EMBY, item['Id'], language) for item in response['Items']]
       return movieIds
     except Exception as e:
       self.logger.error(f"Exception {e} during listMovieIds from Emby -> No movies will be returned!")
-      return []
+      return None
 
   def listGenres(self, language: str) -> list[GenreId]:
       if self.isApiDisabled():
@@ -140,12 +149,17 @@ class Emby(Source):
   def _normalise_genre(self, genre) -> GenreId:
       return GenreId(genre['Name'], emby_id=int(genre['Id']))
 
-  def getMovieIdByTitleYear(self, titles: set[str|None], year: int) -> int:
+  def getMovieIdByTitleYear(self, titles: set[str|None], year: int, uniqueid: dict|None = None) -> int:
     emby_id = -1
 
     if self.isApiDisabled():
       return emby_id
 
+    index = self._titleIndex()
+    if index is not None:
+      found = index.find(titles, year, uniqueid)
+      return found if found is not None else emby_id
+
     try:
       for title in titles:
         if title is None:
@@ -159,6 +173,13 @@ class Emby(Source):
     return emby_id
 
 
+  def _buildTitleIndex(self) -> TitleIndex:
+    result = self._make_emby_query(self._QUERY_MOVIE_TITLES, bulk=True)
+    index = TitleIndex()
+    for item in result['Items']:
+      index.add(int(item['Id']), [item.get('Name'), item.get('OriginalTitle')], item.get('ProductionYear'), item.get('ProviderIds'))
+    return index
+
   def _getMovieIdByTitleYear(self, title: str, year: int) -> int:
     query = self._QUERY_MOVIE_BY_TITLE_YEAR.replace('<title>', urllib.parse.quote(title.lower()))
 
@@ -170,22 +191,26 @@ class Emby(Source):
 
     return -1
 
-  def _make_emby_query(self, query):
-    self.logger.debug(f"making emby query {query}")
+  def _probe(self):
+    return self._SESSION.get(self._QUERY_SYSTEM_INFO, timeout=self._EMBY_TIMEOUT)
 
-    response = requests.get(query, timeout=self._EMBY_TIMEOUT)
-    status_code = response.status_code
-    if status_code == 200:
-      try:
-          json = response.json()
-      except Exception:
-          self.logger.error(f"Result was no json!")
-          raise LookupError(f"Seems like we couldnt connect to Tmdb! Make sure API Key is set correctly!")
-    else:
-      raise LookupError(f"Unexpected status code {status_code} from response {response}")    
-
-    self.logger.debug(f"emby query result {json}/{status_code}")
-    return json
+  def _make_emby_query(self, query, bulk: bool = False):
+    # bulk queries (library listings) arent counted as slow calls
+    self.logger.debug(f"making emby query {query}")
+    with self._BREAKER.guard(bulk):
+      response = self._SESSION.get(query, timeout=self._EMBY_TIMEOUT)
+      status_code = response.status_code
+      if status_code == 200:
+        try:
+            json = response.json()
+        except Exception:
+            self.logger.error(f"Result was no json!")
+            raise LookupError(f"Seems like we couldnt connect to Tmdb! Make sure API Key is set correctly!")
+      else:
+        raise StatusCodeError(status_code, f"Unexpected status code {status_code} from response {response}")    
+
+      self.logger.debug(f"emby query result {json}/{status_code}")
+      return json
 
   @staticmethod
   def getInstance(reset: bool = False) -> 'Emby' :
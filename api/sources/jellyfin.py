@@ -2,8 +2,9 @@ import logging
 import math
 import os
 
-import requests
 import urllib.parse
+from api import env
+from api import http_session
 from api.age_transormer import extract_age_rating
 from api.image_fetcher import fetch_http_image
 from api.models.GenreId import GenreId
@@ -12,6 +13,8 @@ from api.models.MovieId import MovieId
 from api.models.MovieSource import MovieSource
 from api.models.Poster import Poster
 from api.models.db.VotingSession import VotingSession
+from api.title_index import TitleIndex
+from api.circuit_breaker import CircuitBreaker, StatusCodeError
 from .source import Source
 
 class Jellyfin(Source):
@@ -19,15 +22,19 @@ class Jellyfin(Source):
 
   _JELLYFIN_API_KEY = os.environ.get('KT_JELLYFIN_API_KEY', '-')
   _JELLYFIN_URL = os.environ.get('KT_JELLYFIN_URL', 'http://localhost/')
-  _JELLYFIN_TIMEOUT = int(os.environ.get('KT_JELLYFIN_TIMEOUT', '1'))
+  _JELLYFIN_TIMEOUT = env.getInt('KT_JELLYFIN_TIMEOUT', 1)
+  _SESSION = http_session.create('jellyfin')
 
   _QUERY_MOVIES = f"{_JELLYFIN_URL}Items?IncludeItemTypes=Movie&Recursive=True"
   _QUERY_GENRE = f"{_JELLYFIN_URL}Genres"
   _QUERY_MOVIE_BY_ID = f"{_JELLYFIN_URL}Items?Ids=<movie_id>&Fields=Genres,ProductionYear,Overview,OfficialRating,CommunityRating,UserRating,VoteCount"
   _QUERY_IMAGE = f"{_JELLYFIN_URL}Items/<itemId>/Images/<imageType>?tag=<imageTag>"
+  _QUERY_MOVIE_TITLES = f"{_JELLYFIN_URL}Items?IncludeItemTypes=Movie&Recursive=True&Fields=ProductionYear,OriginalTitle,ProviderIds"
+  _QUERY_SYSTEM_INFO = f"{_JELLYFIN_URL}System/Info"
   _QUERY_MOVIE_BY_TITLE_YEAR = f"{_JELLYFIN_URL}/Items?IncludeItemTypes=Movie&Recursive=True&SearchTerm=<title>&Filters=IsNotFolder&Fields=ProductionYear"
 
   _API_DISABLED = None
+  _BREAKER = CircuitBreaker('jellyfin', _JELLYFIN_TIMEOUT)
 
   _instance = None
 
@@ -47,8 +54,7 @@ class Jellyfin(Source):
               self.logger.warning(f"No Jellyfin API Key / URL set => will be disabled!")
             self._API_DISABLED = True
           else:
-            headers = { "X-Emby-Token": f"{self._JELLYFIN_API_KEY}" }
-            response = requests.get(self._QUERY_GENRE, headers=headers, timeout=self._JELLYFIN_TIMEOUT)
+            response = self.probe()
             if response.status_code == 200:
                 self._API_DISABLED = False
                 self.logger.info(f"Jellyfin API reachable => will be enabled!")
@@ -56,20 +62,27 @@ class Jellyfin(Source):
                 self._API_DISABLED = True
                 self.logger.warning(f"Jellyfin API reachable, but API Key invalid => will be disabled!")
             else:
-                self._API_DISABLED = True
-                self.logger.warning(f"Jellyfin API not reachable => will be disabled!")
+                self._API_DISABLED = False
+                self._BREAKER.trip()
+                self.logger.warning(f"Jellyfin API not reachable => circuit opened!")
       except Exception as e:
-          self._API_DISABLED = True
-          self.logger.warning(f"Jellyfin API throwed Exception {e} => will be disabled!")
+          self._API_DISABLED = False
+          self._BREAKER.trip()
+          self.logger.warning(f"Jellyfin API throwed Exception {e} => circuit opened!")
 
-    return self._API_DISABLED
+    return self._API_DISABLED or self._BREAKER.isOpen()
 
-  def getMovieIdByTitleYear(self, titles: set[str|None], year: int) -> str|None:
+  def getMovieIdByTitleYear(self, titles: set[str|None], year: int, uniqueid: dict|None = None) -> str|None:
     jellyfin_id = None
 
     if self.isApiDisabled():
       return jellyfin_id
 
+    index = self._titleIndex()
+    if index is not None:
+      found = index.find(titles, year, uniqueid)
+      return found if found is not None else jellyfin_id
+
     try:
       for title in titles:
         if title is None:
@@ -83,6 +96,13 @@ class Jellyfin(Source):
     return jellyfin_id
 
 
+  def _buildTitleIndex(self) -> TitleIndex:
+    result = self._make_jellyfin_query(self._QUERY_MOVIE_TITLES, bulk=True)
+    index = TitleIndex()
+    for item in result['Items']:
+      index.add(item['Id'], [item.get('Name'), item.get('OriginalTitle')], item.get('ProductionYear'), item.get('ProviderIds'))
+    return index
+
   def _getMovieIdByTitleYear(self, title: str, year: int) -> str|None:
     query = self._QUERY_MOVIE_BY_TITLE_YEAR.replace('<title>', urllib.parse.quote(title.lower()))
 
@@ -140,18 +160,18 @@ class Jellyfin(Source):
           result.append(GenreId(genre))
       return result
 
-  def listMovieIds(self, votingSession: VotingSession) -> list[MovieId]:
+  def listMovieIds(self, votingSession: VotingSession) -> list[MovieId]|None:
     if self.isApiDisabled():
-        return []
+        return None
 
     language = votingSession.getLanguage()
     try:
-      response = self._make_jellyfin_query(self._QUERY_MOVIES)
+      response = self._make_jellyfin_query(self._QUERY_MOVIES, bulk=True)
       movieIds = [MovieId(MovieSource.JELLYFIN, item['Id'], language) for item in response['Items']]
       return movieIds
     except Exception as e:
       self.logger.error(f"Exception {e} during listMovieIds from Jellyfin -> No movies will be returned!")
-      return []
+      return None
 
   def listGenres(self, language: str) -> list[GenreId]:
     if self.isApiDisabled():
@@ -166,27 +186,32 @@ class Jellyfin(Source):
   def _normalise_genre(self, genre) -> GenreId:
     return GenreId(genre['Name'], jellyfin_id=genre['Id'])
 
-  def _make_jellyfin_query(self, query):
+  def _probe(self):
+    headers = { "X-Emby-Token": f"{self._JELLYFIN_API_KEY}" }
+    return self._SESSION.get(self._QUERY_SYSTEM_INFO, headers=headers, timeout=self._JELLYFIN_TIMEOUT)
+
+  def _make_jellyfin_query(self, query, bulk: bool = False):
+    # bulk queries (library listings) arent counted as slow calls
     self.logger.debug(f"making jellyfin query {query}")
+    with self._BREAKER.guard(bulk):
+      headers = {
+        "X-Emby-Token": f"{self._JELLYFIN_API_KEY}"
+      }
 
-    headers = {
-      "X-Emby-Token": f"{self._JELLYFIN_API_KEY}"
-    }
+      response = self._SESSION.get(query, headers=headers, timeout=self._JELLYFIN_TIMEOUT)
+      status_code = response.status_code
+      try:
+        json = response.json()
+      except Exception:
+        self.logger.error(f"Result was no json!")
+        raise LookupError(f"Seems like we couldnt connect to Jellyfin! Make sure API Key is set correctly!")
+
+      self.logger.debug(f"Jellyfin query result {json}/{status_code}")
+      if status_code == 200:
+        return json
+
+      raise StatusCodeError(status_code)
 
-    response = requests.get(query, headers=headers, timeout=self._JELLYFIN_TIMEOUT)
-    status_code = response.status_code
-    try:
-      json = response.json()
-    except Exception:
-      self.logger.error(f"Result was no json!")
-      raise LookupError(f"Seems like we couldnt connect to Jellyfin! Make sure API Key is set correctly!")
-      
-    self.logger.debug(f"Jellyfin query result {json}/{status_code}")
-    if status_code == 200:
-      return json
-
-    raise LookupError('Unexpected status code ' + str(status_code))
-  
   @staticmethod
   def getInstance(reset: bool = False) -> 'Jellyfin' :
     if reset:
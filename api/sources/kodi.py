@@ -1,11 +1,14 @@
+import copy
 import logging
 import os
 
-import requests
 from requests.auth import HTTPBasicAuth
 import urllib.parse
 
+from api import env
 from api import image_fetcher
+from api import http_session
+from api.cache import Cache
 from api.age_transormer import extract_age_rating
 from api.models.Movie import Movie
 from api.models.MovieId import MovieId
@@ -13,6 +16,8 @@ from api.models.GenreId import GenreId
 from api.models.MovieSource import MovieSource
 from api.models.Poster import Poster
 from api.models.db.VotingSession import VotingSession
+from api.title_index import TitleIndex
+from api.circuit_breaker import CircuitBreaker, StatusCodeError
 from .source import Source
 
 class Kodi(Source):
@@ -23,7 +28,18 @@ class Kodi(Source):
   _KODI_HOST = os.environ.get('KT_KODI_HOST', '127.0.0.1')
   _KODI_PORT = os.environ.get('KT_KODI_PORT', '8080')
   _KODI_URL = 'http://' + _KODI_HOST + ':' + _KODI_PORT + '/jsonrpc'
-  _KODI_TIMEOUT = int(os.environ.get('KT_KODI_TIMEOUT', '1'))
+  _KODI_TIMEOUT = env.getInt('KT_KODI_TIMEOUT', 1)
+  _SESSION = http_session.create('kodi')
+  _KODI_BULK_IMPORT = env.getBool('KT_KODI_BULK_IMPORT', True)
+  _KODI_BULK_PAGE_SIZE = max(env.getInt('KT_KODI_BULK_PAGE_SIZE', 100), 1)
+  # library listings (e.g. bulk import pages with all properties) take much longer than single calls
+  _KODI_BULK_TIMEOUT = env.getFloat('KT_KODI_BULK_TIMEOUT', 30)
+
+  _QUERY_PING = {
+    "jsonrpc": "2.0",
+    "method": "JSONRPC.Ping",
+    "id": 1
+  }
 
   _QUERY_MOVIES = {
     "jsonrpc": "2.0",
@@ -32,16 +48,43 @@ class Kodi(Source):
     "id": 1
   }
 
+  _QUERY_MOVIE_TITLES = {
+    "jsonrpc": "2.0",
+    "method": "VideoLibrary.GetMovies",
+    "params": {
+      "properties": ["title", "originaltitle", "year", "uniqueid"]
+    },
+    "id": 1
+  }
+
+  _MOVIE_PROPERTIES = ["file", "title", "originaltitle", "plot", "thumbnail", "year", "genre", "art", "uniqueid", "runtime", "mpaa", "playcount", "rating", "userrating", "votes"]
+
   _QUERY_MOVIE_BY_ID = {
     "jsonrpc": "2.0",
     "method": "VideoLibrary.GetMovieDetails",
     "params": {
       "movieid": 0,
-      "properties": ["file", "title", "originaltitle", "plot", "thumbnail", "year", "genre", "art", "uniqueid", "runtime", "mpaa", "playcount", "rating", "userrating", "votes"]
+      "properties": _MOVIE_PROPERTIES
     },
     "id": 1
   }
 
+  _QUERY_MOVIES_WITH_DETAILS = {
+    "jsonrpc": "2.0",
+    "method": "VideoLibrary.GetMovies",
+    "params": {
+      "properties": _MOVIE_PROPERTIES,
+      "limits": {
+        "start": 0,
+        "end": 0
+      }
+    },
+    "id": 1
+  }
+
+  # builded movies by MovieId, filled by the bulk import and taken by getMovieById
+  _IMPORTED_MOVIES = Cache('kodi_movie', 10000)
+
   _QUERY_GENRES = {
     "jsonrpc": "2.0",
     "method": "VideoLibrary.GetGenres",
@@ -63,6 +106,7 @@ class Kodi(Source):
   }
 
   _API_DISABLED = None
+  _BREAKER = CircuitBreaker('kodi', _KODI_TIMEOUT)
 
   _instance = None
 
@@ -81,7 +125,7 @@ class Kodi(Source):
             self.logger.warning(f"No Kodi host set => will be disabled!")
           self._API_DISABLED = True
         else:
-          response = requests.get(self._KODI_URL, auth=HTTPBasicAuth(self._KODI_USERNAME, self._KODI_PASSWORD), timeout=self._KODI_TIMEOUT)
+          response = self.probe()
           if response.status_code == 200:
               self._API_DISABLED = False
               self.logger.info(f"Kodi API reachable => will be enabled!")
@@ -89,26 +133,31 @@ class Kodi(Source):
               self._API_DISABLED = True
               self.logger.warning(f"Kodi API reachable, but API Key invalid => will be disabled!")
           else:
-              self._API_DISABLED = True
-              self.logger.warning(f"Kodi API not reachable => will be disabled!")
+              self._API_DISABLED = False
+              self._BREAKER.trip()
+              self.logger.warning(f"Kodi API not reachable => circuit opened!")
       except Exception as e:
-        self._API_DISABLED = True
-        self.logger.warning(f"Kodi API throwed Exception {e} => will be disabled!")
+        self._API_DISABLED = False
+        self._BREAKER.trip()
+        self.logger.warning(f"Kodi API throwed Exception {e} => circuit opened!")
 
-    return self._API_DISABLED
+    return self._API_DISABLED or self._BREAKER.isOpen()
 
   def playMovie(self, id: int):
-    query = self._QUERY_PLAY_MOVIE.copy()
+    query = copy.deepcopy(self._QUERY_PLAY_MOVIE)
     query['params']['item']['movieid'] = int(id)
     return self._make_kodi_query(query)
 
-  def listMovieIds(self, votingSession: VotingSession) -> list[MovieId]:
+  def listMovieIds(self, votingSession: VotingSession) -> list[MovieId]|None:
     if self.isApiDisabled():
-      return []
+      return None
 
     language = votingSession.getLanguage()
+    if self._KODI_BULK_IMPORT:
+      return self._importMovies(language)
+
     try:
-      data = self._make_kodi_query(self._QUERY_MOVIES)
+      data = self._make_kodi_query(self._QUERY_MOVIES, bulk=True)
       if 'result' in data and 'movies' in data['result']:
         movies = data['result']['movies']
         ids = []
@@ -118,15 +167,54 @@ class Kodi(Source):
         return ids
     except Exception as e:
       self.logger.error(f"Exception {e} during listMovieIds from Kodi -> No movies will be returned!")
+      return None
 
     return []
 
-  def getMovieIdByTitleYear(self, titles: set[str|None], year: int) -> int:
+  def _importMovies(self, language: str) -> list[MovieId]|None:
+    # Fetches the details of all movies page by page and builds the movies,
+    # so getMovieById doesnt need an extra call per movie afterwards
+    ids = []
+    start = 0
+    try:
+      while True:
+        query = copy.deepcopy(self._QUERY_MOVIES_WITH_DETAILS)
+        query['params']['limits']['start'] = start
+        query['params']['limits']['end'] = start + self._KODI_BULK_PAGE_SIZE
+        data = self._make_kodi_query(query, bulk=True)
+        if 'result' not in data:
+          raise LookupError(f"Unexpected kodi result {data}")
+        if 'movies' not in data['result'] or len(data['result']['movies']) == 0:
+          break
+
+        for moviedetails in data['result']['movies']:
+          kodi_id = int(moviedetails['movieid'])
+          movie = self._toMovie(kodi_id, moviedetails, language)
+          self._IMPORTED_MOVIES.set(movie.movie_id, movie)
+          ids.append(movie.movie_id)
+
+        start += len(data['result']['movies'])
+        total = data['result'].get('limits', {}).get('total', 0)
+        if start >= total:
+          break
+    except Exception as e:
+      self.logger.error(f"Exception {e} during bulk import from Kodi after {len(ids)} movies -> No movies will be returned!")
+      return None
+
+    self.logger.debug(f"imported {len(ids)} movies")
+    return ids
+
+  def getMovieIdByTitleYear(self, titles: set[str|None], year: int, uniqueid: dict|None = None) -> int:
     kodi_id = -1
 
     if self.isApiDisabled():
       return kodi_id
 
+    index = self._titleIndex()
+    if index is not None:
+      found = index.find(titles, year, uniqueid)
+      return found if found is not None else kodi_id
+
     try:
       for title in titles:
         if title is None:
@@ -141,6 +229,16 @@ class Kodi(Source):
 
     return kodi_id
 
+  def _buildTitleIndex(self) -> TitleIndex:
+    data = self._make_kodi_query(self._QUERY_MOVIE_TITLES, bulk=True)
+    if 'result' not in data:
+      raise LookupError(f"Unexpected kodi result {data}")
+
+    index = TitleIndex()
+    for movie in data['result'].get('movies', []):
+      index.add(int(movie['movieid']), [movie.get('title'), movie.get('originaltitle')], movie.get('year'), movie.get('uniqueid'))
+    return index
+
   def _getMovieIdByTitleYear(self, title: str, year: int, titleField: str) -> int:
     query = {
       "jsonrpc": "2.0",
@@ -163,22 +261,30 @@ class Kodi(Source):
           return movie['movieid']
     return -1
 
+  def dropImportedMovie(self, movie_id: MovieId):
+    self._IMPORTED_MOVIES.pop(movie_id)
+
   def getMovieById(self, kodi_id: int, language: str) -> Movie|None:
     if self.isApiDisabled():
       return None
 
-    data = None
-    try:
-      query = self._QUERY_MOVIE_BY_ID.copy()
-      query['params']['movieid'] = int(kodi_id)
-      data = self._make_kodi_query(query)
-    except Exception as e:
-      self.logger.error(f"Exception {e} for movie with kodiId {kodi_id}")
+    # an imported movie is handed out once, the caller caches the completed movie
+    movie = self._IMPORTED_MOVIES.pop(MovieId(MovieSource.KODI, int(kodi_id), language))
+    if movie is not None:
+      self.logger.debug(f"using imported movie with kodiId {kodi_id}")
+      return movie
+
+    # failed requests raise, only an unknown id returns None
+    query = copy.deepcopy(self._QUERY_MOVIE_BY_ID)
+    query['params']['movieid'] = int(kodi_id)
+    data = self._make_kodi_query(query)
 
     if data is None or 'result' not in data or 'moviedetails' not in data['result']:
       return None
 
-    moviedetails = data['result']['moviedetails']
+    return self._toMovie(kodi_id, data['result']['moviedetails'], language)
+
+  def _toMovie(self, kodi_id: int, moviedetails: dict, language: str) -> Movie:
     result = Movie(MovieId(
               MovieSource.KODI, kodi_id, language),
               moviedetails['title'],
@@ -238,23 +344,29 @@ class Kodi(Source):
   def _normalise_genre(self, genre) -> GenreId:
     return GenreId(genre['label'], kodi_id=genre['genreid'])
 
-  def _make_kodi_query(self, query):
-    self.logger.debug(f"making kodi query {query}")
-    response = requests.post(self._KODI_URL, json=query, auth=HTTPBasicAuth(self._KODI_USERNAME, self._KODI_PASSWORD), timeout=self._KODI_TIMEOUT)
-    status_code = response.status_code
-    try:
-      json = response.json()
-    except Exception as e:
-      self.logger.error(f"Result was no json! {e}")
-      raise LookupError(f"Seems like we couldnt connect to Kodi! Make sure host, port, username and password a set correctly!")
-    if 'error' in json:
-      self.logger.error(f"kodi query result {json}/{status_code}")
-    else:
-      self.logger.debug(f"kodi query result {json}/{status_code}")
-    if status_code == 200:
-      return json
+  def _probe(self):
+    return self._SESSION.post(self._KODI_URL, json=self._QUERY_PING, auth=HTTPBasicAuth(self._KODI_USERNAME, self._KODI_PASSWORD), timeout=self._KODI_TIMEOUT)
 
-    raise LookupError('Unexpected status code ' + str(status_code))
+  def _make_kodi_query(self, query, bulk: bool = False):
+    # bulk queries (library listings) get their own timeout and arent counted as slow calls
+    self.logger.debug(f"making kodi query {query}")
+    with self._BREAKER.guard(bulk):
+      response = self._SESSION.post(self._KODI_URL, json=query, auth=HTTPBasicAuth(self._KODI_USERNAME, self._KODI_PASSWORD),
+                                    timeout=self._KODI_BULK_TIMEOUT if bulk else self._KODI_TIMEOUT)
+      status_code = response.status_code
+      try:
+        json = response.json()
+      except Exception as e:
+        self.logger.error(f"Result was no json! {e}")
+        raise LookupError(f"Seems like we couldnt connect to Kodi! Make sure host, port, username and password a set correctly!")
+      if 'error' in json:
+        self.logger.error(f"kodi query result {json}/{status_code}")
+      else:
+        self.logger.debug(f"kodi query result {json}/{status_code}")
+      if status_code == 200:
+        return json
+
+      raise StatusCodeError(status_code)
 
   def _decode_image_url(self, encoded_image_url) -> Poster|None:
     if encoded_image_url is None or encoded_image_url == '':
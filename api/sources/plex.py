@@ -3,14 +3,17 @@ import logging
 import math
 import os
 
+from api import env
+from api import http_session
 from api.image_fetcher import fetch_http_image
 
-import requests
 from api.models.GenreId import GenreId
 from api.models.Movie import Movie
 from api.models.MovieId import MovieId
 from api.models.MovieSource import MovieSource
 from api.models.db.VotingSession import VotingSession
+from api.title_index import TitleIndex
+from api.circuit_breaker import CircuitBreaker, StatusCodeError
 from .source import Source
 
 import xml.etree.ElementTree as ET
@@ -21,15 +24,19 @@ class Plex(Source):
 
   _PLEX_API_KEY = os.environ.get('KT_PLEX_API_KEY', '-')
   _PLEX_URL = os.environ.get('KT_PLEX_URL', 'http://localhost/')
-  _PLEX_TIMEOUT = int(os.environ.get('KT_PLEX_TIMEOUT', '1'))
+  _PLEX_TIMEOUT = env.getInt('KT_PLEX_TIMEOUT', 1)
+  _SESSION = http_session.create('plex')
 
+  # server root, small but other than /identity it checks the token
+  _QUERY_SERVER = _PLEX_URL
   _QUERY_SECTIONS = _PLEX_URL + 'library/sections'
   _QUERY_SECTION = _PLEX_URL + 'library/sections/<section_id>/all'
+  _QUERY_SECTION_WITH_GUIDS = _PLEX_URL + 'library/sections/<section_id>/all?includeGuids=1'
   _QUERY_MOVIE_BY_ID = _PLEX_URL +  'library/metadata/<movie_id>'
-  _QUERY_MOVIE_BY_TITLE_YEAR = _PLEX_URL + 'library/sections/<section_id>/search?query=<title>&year=<year>'
 
   _MOVIE_SECTION_IDS = None
   _API_DISABLED = None
+  _BREAKER = CircuitBreaker('plex', _PLEX_TIMEOUT)
 
   _instance = None
 
@@ -49,7 +56,7 @@ class Plex(Source):
             self.logger.warning(f"No Plex API Key / URL set => will be disabled!")
           self._API_DISABLED = True
         else:
-          response = requests.get(self._QUERY_SECTIONS, headers=self._headers(), timeout=self._PLEX_TIMEOUT)
+          response = self.probe()
           if response.status_code == 200:
             self._API_DISABLED = False
             self.logger.info(f"Plex API reachable => will be enabled!")
@@ -57,41 +64,46 @@ class Plex(Source):
             self._API_DISABLED = True
             self.logger.warning(f"Plex API reachable, but API Key invalid => will be disabled!")
           else:
-            self._API_DISABLED = True
-            self.logger.warning(f"Plex API not reachable => will be disabled!")
+            self._API_DISABLED = False
+            self._BREAKER.trip()
+            self.logger.warning(f"Plex API not reachable => circuit opened!")
       except Exception as e:
-        self._API_DISABLED = True
-        self.logger.warning(f"Plex API throwed Exception {e} => will be disabled!")
+        self._API_DISABLED = False
+        self._BREAKER.trip()
+        self.logger.warning(f"Plex API throwed Exception {e} => circuit opened!")
 
-    return self._API_DISABLED
+    return self._API_DISABLED or self._BREAKER.isOpen()
 
-  def getMovieIdByTitleYear(self, titles: set[str|None], year: int) -> int:
+  def getMovieIdByTitleYear(self, titles: set[str|None], year: int, uniqueid: dict|None = None) -> int:
     plex_id = -1
 
     if self.isApiDisabled():
       return plex_id
-    
-    return plex_id
-    # TODO doesnt work this way :/
-    for title in titles:
-      if title is None:
-        continue
-      for section in self._listMovieSections():
-        plex_id = self._getMovieIdBySectionTitleYear(section, title, year)
-        if plex_id > 0:
-          return plex_id
+
+    # the plex search doesnt work reliable, so only the title index is used
+    index = self._titleIndex()
+    if index is not None:
+      found = index.find(titles, year, uniqueid)
+      if found is not None:
+        plex_id = found
 
     return plex_id
 
-  def _getMovieIdBySectionTitleYear(self, section: int, title: str, year: int) -> int:
-    query = self._QUERY_MOVIE_BY_TITLE_YEAR.replace('<section_id>', str(section)).replace('<title>', title).replace('<year>', str(year))
-    result = self._make_plex_query(query)
-    video = result.find('.//Video')
-    if video is not None:
-      movie_id = video.attrib.get("ratingKey")
-      if movie_id is not None:
-        return int(movie_id)
-    return -1
+  def _buildTitleIndex(self) -> TitleIndex:
+    index = TitleIndex()
+    for section in self._listMovieSections():
+      result = self._make_plex_query(self._QUERY_SECTION_WITH_GUIDS.replace('<section_id>', str(section)), bulk=True)
+      for video in result.findall(".//Video"):
+        movie_id = video.attrib.get("ratingKey")
+        if movie_id is None:
+          continue
+        uniqueid = {}
+        for guid in video.findall('Guid'):
+          provider, _, value = guid.attrib.get('id', '').partition('://')
+          if value != '':
+            uniqueid[provider] = value
+        index.add(int(movie_id), [video.attrib.get('title'), video.attrib.get('originalTitle')], video.attrib.get('year'), uniqueid)
+    return index
 
   def getMovieById(self, plex_id: int, language: str) -> Movie|None:
     if self.isApiDisabled():
@@ -168,16 +180,16 @@ class Plex(Source):
       self.logger.error(f"couldnt transform plex rating {rating}")
       return None
 
-  def listMovieIds(self, votingSession: VotingSession) -> list[MovieId]:
+  def listMovieIds(self, votingSession: VotingSession) -> list[MovieId]|None:
     if self.isApiDisabled():
-        return []
+        return None
 
     language = votingSession.getLanguage()
     try:
       movie_ids = []
       sections = self._listMovieSections()
       for section in sections:
-        result = self._make_plex_query(self._QUERY_SECTION.replace('<section_id>', str(section)))
+        result = self._make_plex_query(self._QUERY_SECTION.replace('<section_id>', str(section)), bulk=True)
         for video in result.findall(".//Video"):
             movie_id = video.attrib.get("ratingKey")
             if movie_id is not None:
@@ -185,7 +197,7 @@ class Plex(Source):
       return movie_ids
     except Exception as e:
       self.logger.error(f"Exception {e} during listMovieIds from Plex -> No movies will be returned!")
-      return []
+      return None
 
   def _listMovieSections(self) -> list[int]:
     if self._MOVIE_SECTION_IDS is None:    
@@ -208,7 +220,7 @@ class Plex(Source):
     genres = []
     sections = self._listMovieSections()
     for section in sections:
-      result = self._make_plex_query(self._QUERY_SECTION.replace('<section_id>', str(section)))
+      result = self._make_plex_query(self._QUERY_SECTION.replace('<section_id>', str(section)), bulk=True)
       for genre in result.findall(".//Genre"):
         tag = genre.attrib.get('tag')
         if tag is not None:
@@ -221,23 +233,27 @@ class Plex(Source):
     }
     return headers
   
-  def _make_plex_query(self, query) -> Element:
+  def _probe(self):
+    return self._SESSION.get(self._QUERY_SERVER, headers=self._headers(), timeout=self._PLEX_TIMEOUT)
+
+  def _make_plex_query(self, query, bulk: bool = False) -> Element:
+    # bulk queries (library listings) arent counted as slow calls
     self.logger.debug(f"making plex query {query}")
+    with self._BREAKER.guard(bulk):
+      response = self._SESSION.get(query, headers=self._headers(), timeout=self._PLEX_TIMEOUT)
+      status_code = response.status_code
+      try:
+        xml = ET.fromstring(response.content)
+      except Exception:
+        self.logger.error(f"Result was no json!")
+        raise LookupError(f"Seems like we couldnt connect to Jellyfin! Make sure API Key is set correctly!")
+
+      self.logger.debug(f"Plex query result {xml}/{status_code}")
+      if status_code == 200:
+        return xml
+
+      raise StatusCodeError(status_code)
 
-    response = requests.get(query, headers=self._headers(), timeout=self._PLEX_TIMEOUT)
-    status_code = response.status_code
-    try:
-      xml = ET.fromstring(response.content)
-    except Exception:
-      self.logger.error(f"Result was no json!")
-      raise LookupError(f"Seems like we couldnt connect to Jellyfin! Make sure API Key is set correctly!")
-      
-    self.logger.debug(f"Plex query result {xml}/{status_code}")
-    if status_code == 200:
-      return xml
-
-    raise LookupError('Unexpected status code ' + str(status_code))
-  
   @staticmethod
   def getInstance() -> 'Plex' :
     return Plex()
\ No newline at end of file
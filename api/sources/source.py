@@ -1,18 +1,63 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
+import time
 
+from api import env
 from api.models.GenreId import GenreId
 from api.models.Movie import Movie
 from api.models.MovieId import MovieId
 from api.models.db.VotingSession import VotingSession
+from api.title_index import TitleIndex
 
 class Source(ABC):
 
+    _TITLE_INDEX_REFRESH = env.getInt('KT_TITLE_INDEX_REFRESH', 3600)
+    _TITLE_INDEX_LOCKS = {}
+    _TITLE_INDEX_LOCKS_LOCK = threading.Lock()
+    _TITLE_INDEX = None
+    _PROBE_DEADLINE = env.getFloat('KT_API_PROBE_DEADLINE', 5)
+    # smoothed latency of the successful probes of the source, None before the first one
+    _PROBE_LATENCY = None
+    # one pool for all checks; a probe still hanging from the last check isnt started again
+    _PROBE_POOL = ThreadPoolExecutor(max_workers=max(env.getInt('KT_API_PROBE_WORKERS', 8), 1), thread_name_prefix='probe')
+    _PROBES = {}
+    _PROBES_LOCK = threading.Lock()
+
     @abstractmethod
     def isApiDisabled(self, forceReCheck = False) -> bool:
         pass
 
     @abstractmethod
-    def getMovieIdByTitleYear(self, titles: set[str|None], year: int) -> int|str|None:
+    def _probe(self):
+        """
+        Cheapest authenticated request to the source, returns its response
+        """
+        pass
+
+    def probe(self):
+        """
+        Checks the reachability of the source with _probe and feeds successful
+        probes to the circuit breaker of the source. Their (smoothed) latency
+        sets the slow call threshold of the breaker.
+        """
+        start = time.monotonic()
+        response = self._probe()
+        latency = time.monotonic() - start
+        self.logger.debug(f"probe answered with {response.status_code} after {latency:.3f}s")
+        if response.status_code != 200:
+            return response
+
+        cls = type(self)
+        cls._PROBE_LATENCY = latency if cls._PROBE_LATENCY is None else 0.7 * cls._PROBE_LATENCY + 0.3 * latency
+        breaker = getattr(self, '_BREAKER', None)
+        if breaker is not None:
+            breaker.record(True, latency)
+            breaker.adjustSlowCall(cls._PROBE_LATENCY)
+        return response
+
+    @abstractmethod
+    def getMovieIdByTitleYear(self, titles: set[str|None], year: int, uniqueid: dict|None = None) -> int|str|None:
         pass
 
     @abstractmethod
@@ -20,15 +65,67 @@ class Source(ABC):
         pass
 
     @abstractmethod
-    def listMovieIds(self, votingSession: VotingSession) -> list[MovieId]:
+    def listMovieIds(self, votingSession: VotingSession) -> list[MovieId]|None:
+        """
+        Lists the movies of the source for the session.
+        Returns None, if the source couldnt be listed (completely).
+        """
         pass
 
     @abstractmethod
     def listGenres(self, language: str) -> list[GenreId]:
         pass
 
+    def _buildTitleIndex(self) -> TitleIndex|None:
+        """
+        Lists the whole library of the source into a TitleIndex.
+        Sources without a (cheap) library listing return None.
+        """
+        return None
+
+    def _titleIndex(self) -> TitleIndex|None:
+        # The index is (re)built by the first caller, while others keep using the old one
+        cls = type(self)
+        index = cls._TITLE_INDEX
+        if index is not None and not index.isStale(self._TITLE_INDEX_REFRESH):
+            return index if index.complete else None
+
+        with Source._TITLE_INDEX_LOCKS_LOCK:
+            lock = Source._TITLE_INDEX_LOCKS.setdefault(cls, threading.Lock())
+        if not lock.acquire(blocking=index is None):
+            return index if index.complete else None
+
+        try:
+            if cls._TITLE_INDEX is index:
+                try:
+                    built = self._buildTitleIndex()
+                except Exception as e:
+                    self.logger.error(f"Exception {e} during building title index -> using remote search!")
+                    built = TitleIndex(complete=False)
+                if built is not None:
+                    self.logger.debug(f"title index with {len(built)} entries build")
+                    cls._TITLE_INDEX = built
+            index = cls._TITLE_INDEX
+            return index if index is not None and index.complete else None
+        finally:
+            lock.release()
+
     @staticmethod
     def apisDisabled(forceReCheck = False):
-        for subclass in Source.__subclasses__():
-            instance = subclass()
-            instance.isApiDisabled(forceReCheck)
\ No newline at end of file
+        # all sources are checked at once, a source not answering within the deadline counts as unreachable
+        sources = [subclass() for subclass in Source.__subclasses__()]
+        futures = {}
+        with Source._PROBES_LOCK:
+            for source in sources:
+                future = Source._PROBES.get(type(source))
+                if future is None or future.done():
+                    future = Source._PROBE_POOL.submit(source.isApiDisabled, forceReCheck)
+                    Source._PROBES[type(source)] = future
+                futures[future] = source
+        _, pending = wait(futures, timeout=Source._PROBE_DEADLINE)
+        for future in pending:
+            source = futures[future]
+            source.logger.warning(f"API availability check didnt finish within {Source._PROBE_DEADLINE}s => circuit opened!")
+            breaker = getattr(source, '_BREAKER', None)
+            if breaker is not None:
+                breaker.trip()
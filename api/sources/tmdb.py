@@ -1,10 +1,14 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
+import math
 import os
 
-import requests
 
+from api import env
+from api import http_session
 from api.age_transormer import mpaa_to_fsk
+from api.cache import Cache
 from api.models.Poster import Poster
 from .emby import Emby
 from .plex import Plex
@@ -19,6 +23,9 @@ from api.models.MovieProvider import MovieProvider
 from api.models.MovieSource import MovieSource
 from api.models.db.VotingSession import VotingSession
 from api.models.MovieProvider import fromString as mp_fromString
+from api.movie_store import MovieStore
+from api.rate_limiter import TokenBucket
+from api.circuit_breaker import CircuitBreaker, StatusCodeError
 from .source import Source
 
 class Tmdb(Source):
@@ -27,12 +34,16 @@ class Tmdb(Source):
   _TMDB_API_KEY = os.environ.get('KT_TMDB_API_KEY', '-')
   _TMDB_API_LANGUAGE = os.environ.get('KT_TMDB_API_LANGUAGE', 'de-DE')
   _TMDB_API_REGION = os.environ.get('KT_TMDB_API_REGION', 'DE')
-  _TMDB_API_TIMEOUT = int(os.environ.get('KT_TMDB_API_TIMEOUT', '3'))
+  _TMDB_API_TIMEOUT = env.getInt('KT_TMDB_API_TIMEOUT', 3)
+  _SESSION = http_session.create('tmdb')
   _TMDB_API_DISCOVER_SORT_BY = os.environ.get('KT_TMDB_API_DISCOVER_SORT_BY', 'popularity')
   _TMDB_API_DISCOVER_SORT_ORDER = os.environ.get('KT_TMDB_API_DISCOVER_SORT_ORDER', 'desc')
   _TMDB_API_DISCOVER_START_DATE = os.environ.get('KT_TMDB_API_DISCOVER_RELEASE_DATE_START', '1800-01-01')
-  _TMDB_API_DISCOVER_TOTAL = min(int(os.environ.get('KT_TMDB_API_DISCOVER_TOTAL', '200')), 1000)
+  _TMDB_API_DISCOVER_TOTAL = min(env.getInt('KT_TMDB_API_DISCOVER_TOTAL', 200), 1000)
+  _TMDB_API_DISCOVER_PARALLEL = max(env.getInt('KT_TMDB_API_DISCOVER_PARALLEL', 5), 1)
+  _TMDB_API_DISCOVER_PAGE_SIZE = 20
   _TMDB_API_INCLUDE_ADULT = os.environ.get('KT_TMDB_API_INCLUDE_ADULT', 'false')
+  _TMDB_API_RETRIES = max(env.getInt('KT_TMDB_API_RETRIES', 3), 0)
 
   _TMDB_API = "https://api.themoviedb.org/3"
   _QUERY_MOVIE = f"{_TMDB_API}/movie/<tmdb_id>?append_to_response=release_dates,videos,watch/providers&language=<language>"
@@ -40,15 +51,18 @@ class Tmdb(Source):
   _QUERY_POSTER = f"https://image.tmdb.org/t/p/w500<poster_path>"
   _QUERY_DISCOVER = f"{_TMDB_API}/discover/movie?include_adult={_TMDB_API_INCLUDE_ADULT}&include_video=false&language=<language>&page=<page>&sort_by=<sort_by>&watch_region=<region>&with_watch_providers=<provider_id>&release_date.lte=<release_date.lte>&release_date.gte=<release_date.gte>&with_watch_monetization_types=flatrate|free|rent"
   _QUERY_GENRES = f"{_TMDB_API}/genre/movie/list?language=<language>"
+  _QUERY_CONFIGURATION = f"{_TMDB_API}/configuration"
   _QUERY_PROVIDERS = f"{_TMDB_API}/watch/providers/movie"
   _QUERY_REGIONS = f"{_TMDB_API}/watch/providers/regions?language={_TMDB_API_LANGUAGE}"
 
-  _GENRES_BY_LANGUAGE = {}
-  _MOVIE_MAP = {}
-  _TMDB_PROVIDERS = None
+  # regions, providers and genres by language; refreshed in the background once a day
+  _REFERENCE_DATA = Cache('tmdb_reference', 0, soft_ttl=86400)
+  _MOVIE_MAP = Cache('tmdb_movie', 5000)
   _PROVIDER2TMDB_PROVIDER = {}
   _API_DISABLED = None
-  _REGIONS = None
+  _BREAKER = CircuitBreaker('tmdb', _TMDB_API_TIMEOUT)
+  # shared by all tmdb requests (api and posters)
+  _RATE_LIMIT = TokenBucket('tmdb', env.getFloat('KT_TMDB_API_RATE_LIMIT', 40), env.getInt('KT_TMDB_API_RATE_BURST', 20))
 
   _instance = None
 
@@ -97,10 +111,7 @@ class Tmdb(Source):
             self.logger.warning(f"No TMDB API Key / URL set => will be disabled!")
           self._API_DISABLED = True
         else:
-          headers = { "Authorization": f"Bearer {self._TMDB_API_KEY}" }
-          url = f"https://api.themoviedb.org/3/movie/popular?page=1"
-          response = requests.get(url, headers=headers, timeout=self._TMDB_API_TIMEOUT)
-
+          response = self.probe()
           if response.status_code == 200:
               self._API_DISABLED = False
               self.logger.info(f"TMDB API reachable => will be enabled!")
@@ -108,13 +119,15 @@ class Tmdb(Source):
               self._API_DISABLED = True
               self.logger.warning(f"TMDB API reachable, but API Key invalid => will be disabled!")
           else:
-              self._API_DISABLED = True
-              self.logger.warning(f"TMDB API not reachable => will be disabled!")
+              self._API_DISABLED = False
+              self._BREAKER.trip()
+              self.logger.warning(f"TMDB API not reachable => circuit opened!")
       except Exception as e:
-        self._API_DISABLED = True
-        self.logger.warning(f"TMDB API throwed Exception {e} => will be disabled!")
+        self._API_DISABLED = False
+        self._BREAKER.trip()
+        self.logger.warning(f"TMDB API throwed Exception {e} => circuit opened!")
 
-    return self._API_DISABLED
+    return self._API_DISABLED or self._BREAKER.isOpen()
 
   def get_poster_by_id(self, tmdb_id, language: str = _TMDB_API_LANGUAGE) -> Poster|None:
     if self._TMDB_API_KEY is None or self._TMDB_API_KEY == '' or self._TMDB_API_KEY == '-' or self.isApiDisabled():
@@ -122,7 +135,11 @@ class Tmdb(Source):
 
     self.logger.debug(f"try to receive image from tmdb id ...")
 
-    data = self._getPureMovie(tmdb_id, language)
+    try:
+      data = self._getPureMovie(tmdb_id, language)
+    except Exception as e:
+      self.logger.error(f"Exception {e} for movie with tmdbId {tmdb_id}")
+      return None
     
     if data is not None and 'poster_path' in data and data['poster_path'] is not None:
       return self._get_poster_by_poster_path(data['poster_path'])
@@ -131,28 +148,28 @@ class Tmdb(Source):
 
   def _get_poster_by_poster_path(self, poster_path: str) -> Poster|None:
     poster_url = self._QUERY_POSTER.replace('<poster_path>', poster_path)
+    self._RATE_LIMIT.acquire()
     return fetch_http_image(poster_url)
 
   def listRegions(self) -> list[dict]:
     if self.isApiDisabled():
       return []
 
-    if self._REGIONS is None:
-      data = self._make_tmdb_query(self._QUERY_REGIONS)
-      regions = list(map(lambda r: { 'name': r['native_name'], 'iso': r['iso_3166_1']}, data['results']))
-      self._REGIONS = regions
-    return self._REGIONS
+    return self._REFERENCE_DATA.getOrLoad('regions', self._loadRegions)
+
+  def _loadRegions(self) -> list[dict]:
+    data = self._make_tmdb_query(self._QUERY_REGIONS)
+    return list(map(lambda r: { 'name': r['native_name'], 'iso': r['iso_3166_1']}, data['results']))
 
   def listGenres(self, language: str) -> list[GenreId]:
     if self.isApiDisabled():
       return []
 
-    if not language in self._GENRES_BY_LANGUAGE:
-      genres = self._QUERY_GENRES.replace('<language>', language)
-      data = self._make_tmdb_query(genres)
-      genres = list(map(self._normalise_genre, data['genres']))
-      self._GENRES_BY_LANGUAGE[language] = genres
-    return self._GENRES_BY_LANGUAGE.get(language, [])
+    return self._REFERENCE_DATA.getOrLoad(('genres', language), self._loadGenres, language)
+
+  def _loadGenres(self, language: str) -> list[GenreId]:
+    data = self._make_tmdb_query(self._QUERY_GENRES.replace('<language>', language))
+    return list(map(self._normalise_genre, data['genres']))
 
   def listRegionAvailableProvider(self, region: str = _TMDB_API_REGION) -> list[MovieProvider]:
     providers = []
@@ -169,21 +186,22 @@ class Tmdb(Source):
     if self.isApiDisabled():
       return []
 
-    if self._TMDB_PROVIDERS is None:
-      data = self._make_tmdb_query(self._QUERY_PROVIDERS)
-      providers = []
-      for provider in data['results']:
-        name = provider['provider_name']
-        id = provider['provider_id']
-        regions = list(provider['display_priorities'].keys())
-
-        providers.append({
-          'name': name,
-          'id': id,
-          'regions': regions
-        })
-      self._TMDB_PROVIDERS = providers
-    return self._TMDB_PROVIDERS
+    return self._REFERENCE_DATA.getOrLoad('providers', self._loadProviders)
+
+  def _loadProviders(self) -> list:
+    data = self._make_tmdb_query(self._QUERY_PROVIDERS)
+    providers = []
+    for provider in data['results']:
+      name = provider['provider_name']
+      id = provider['provider_id']
+      regions = list(provider['display_priorities'].keys())
+
+      providers.append({
+        'name': name,
+        'id': id,
+        'regions': regions
+      })
+    return providers
 
   def _kinderProvider2TmdbProviders(self, provider : MovieProvider) -> list[dict]:
       if len(self._PROVIDER2TMDB_PROVIDER) == 0:
@@ -212,9 +230,9 @@ class Tmdb(Source):
             return provider
     return None
 
-  def listMovieIds(self, session: VotingSession) -> list[MovieId]:
+  def listMovieIds(self, session: VotingSession) -> list[MovieId]|None:
     if self.isApiDisabled():
-      return []
+      return None
 
     discover = session.getTmdbDiscover()
     region =  discover.region if discover is not None and discover.region is not None else self._TMDB_API_REGION
@@ -275,42 +293,87 @@ class Tmdb(Source):
       baseQuery += '&vote_count.gte=' + str(vote_count)
 
     total = discover.getTotal() if discover else self._TMDB_API_DISCOVER_TOTAL
+    try:
+      pages = self._discoverPages(baseQuery, total)
+    except Exception as e:
+      self.logger.error(f"Exception {e} during listMovieIds from TMDB -> No movies will be returned!")
+      return None
+
     movieIds = []
-    i = 1
-    while len(movieIds) < total:
-      query = baseQuery.replace('<page>', str(i))
-      result = self._make_tmdb_query(query)
-      if 'results' in result and len(result['results']) == 0:
-        break
-      i+=1
-      if 'results' in result:
-        for movie in result['results']:
-          movieIds.append(MovieId(MovieSource.TMDB, movie['id'], language))
-    
+    for result in pages:
+      for movie in result['results']:
+        movieIds.append(MovieId(MovieSource.TMDB, movie['id'], language))
+
     return movieIds
-    
+
+  def _discoverPages(self, baseQuery: str, total: int) -> list[dict]:
+    # The first page tells how many pages there are,
+    # all further pages will be fetched concurrently (but kept in order)
+    first = self._make_tmdb_query(baseQuery.replace('<page>', '1'))
+    if len(first.get('results', [])) == 0:
+      return []
+
+    pages = [first]
+    wanted = math.ceil(total / self._TMDB_API_DISCOVER_PAGE_SIZE)
+    available = int(first.get('total_pages', wanted))
+    last = min(wanted, available)
+    if last <= 1:
+      return pages
+
+    with ThreadPoolExecutor(max_workers=min(self._TMDB_API_DISCOVER_PARALLEL, last - 1)) as pool:
+      futures = [pool.submit(self._make_tmdb_query, baseQuery.replace('<page>', str(page))) for page in range(2, last + 1)]
+      for index, future in enumerate(futures):
+        try:
+          result = future.result()
+        except Exception:
+          for pending in futures[index + 1:]:
+            pending.cancel()
+          raise
+        if len(result.get('results', [])) == 0:
+          for pending in futures[index + 1:]:
+            pending.cancel()
+          break
+        pages.append(result)
+
+    return pages
 
   def _normalise_genre(self, genre) -> GenreId:
     return GenreId(genre['name'], tmdb_id=genre['id'])
 
+  def dropMovieData(self, tmdb_id: int, language: str):
+    self._MOVIE_MAP.pop(tmdb_id)
+    MovieStore.getInstance().deleteSourceData('tmdb', f"{tmdb_id}:{language}")
+
   def _getPureMovie(self, tmdb_id: int, language: str = _TMDB_API_LANGUAGE):
-    if tmdb_id in self._MOVIE_MAP:
+    data = self._MOVIE_MAP.get(tmdb_id, Cache.MISSING)
+    if data is not Cache.MISSING:
       self.logger.debug(f"getting tmdb movie with id {tmdb_id} from cache")
-      return self._MOVIE_MAP.get(tmdb_id)
+      return data
+
+    storeKey = f"{tmdb_id}:{language}"
+    data = MovieStore.getInstance().getSourceData('tmdb', storeKey)
+    if data is not None:
+      self.logger.debug(f"getting tmdb movie with id {tmdb_id} from store")
+      self._MOVIE_MAP.set(tmdb_id, data)
+      return data
 
-    data = None
+    # failed requests raise, only an unknown id returns None (and isnt cached,
+    # the caller remembers missing movies with a backoff)
     try:
       query = self._QUERY_MOVIE \
         .replace('<tmdb_id>', str(tmdb_id)) \
         .replace('<language>', language)
       data = self._make_tmdb_query(query)
-    except Exception as e:
-      self.logger.error(f"Exception {e} for movie with tmdbId {tmdb_id}")
+    except StatusCodeError as e:
+      if e.status_code != 404:
+        raise
+      data = None
 
     if data is None or 'id' not in data:
-      data = None
+      return None
 
-    self._MOVIE_MAP[tmdb_id] = data
+    MovieStore.getInstance().putSourceData('tmdb', storeKey, data)
+    self._MOVIE_MAP.set(tmdb_id, data)
     
     return data
 
@@ -351,7 +414,7 @@ class Tmdb(Source):
 
     return result
 
-  def getMovieIdByTitleYear(self, titles: set[str | None], year: int) -> str|None:
+  def getMovieIdByTitleYear(self, titles: set[str | None], year: int, uniqueid: dict|None = None) -> str|None:
     raise NotImplementedError
 
   def _extract_provider(self, tmdb_providers) -> list[MovieProvider]:
@@ -404,24 +467,61 @@ class Tmdb(Source):
 
   def _make_tmdb_query(self, query):
     self.logger.debug(f"making tmdb query {query}")
-
+    attempt = 0
+    while True:
+      self._RATE_LIMIT.acquire()
+      with self._BREAKER.guard():
+        response = self._query_tmdb(query)
+        # throttled requests are retried after the Retry-After, until the retries are used up
+        if response.status_code != 429 or attempt >= self._TMDB_API_RETRIES:
+          return self._read_tmdb_response(response)
+      attempt += 1
+      self._RATE_LIMIT.pause(self._retry_after(response))
+
+  def rateLimitStats(self) -> dict:
+    """
+    Number of tmdb requests, how many / how long they waited for the rate limit and the number of 429s
+    """
+    return self._RATE_LIMIT.stats()
+
+  def logRateLimitStats(self):
+    stats = self.rateLimitStats()
+    if stats['requests'] <= 0:
+      return
+    self.logger.info(f"tmdb rate limit: {stats['requests']} requests, {stats['waited']} waited"
+                     + f" (avg {stats['wait_avg']}s, max {stats['wait_max']}s, total {stats['wait_total']}s),"
+                     + f" {stats['throttled']} throttled")
+
+  def _probe(self):
+    self._RATE_LIMIT.acquire()
+    return self._query_tmdb(self._QUERY_CONFIGURATION)
+
+  def _query_tmdb(self, query):
     headers = {
       "Authorization": f"Bearer {self._TMDB_API_KEY}"
     }
+    return self._SESSION.get(query, headers=headers, timeout=self._TMDB_API_TIMEOUT)
+
+  def _retry_after(self, response) -> float:
+    try:
+      return max(float(response.headers.get('Retry-After', '1')), 0)
+    except ValueError:
+      # Retry-After may also be a http date
+      return 1.0
 
-    response = requests.get(query, headers=headers, timeout=self._TMDB_API_TIMEOUT)
+  def _read_tmdb_response(self, response):
     status_code = response.status_code
     try:
       json = response.json()
     except Exception:
       self.logger.error(f"Result was no json!")
       raise LookupError(f"Seems like we couldnt connect to Tmdb! Make sure API Key is set correctly!")
-      
+
     self.logger.debug(f"tmdb query result {json}/{status_code}")
     if status_code == 200:
       return json
 
-    raise LookupError('Unexpected status code ' + str(status_code))
+    raise StatusCodeError(status_code)
 
   @staticmethod
   def getInstance() -> 'Tmdb' :
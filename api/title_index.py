@@ -0,0 +1,57 @@
+import re
+import time
+import unicodedata
+
+def normalize(title: str|None) -> str|None:
+  if title is None:
+    return None
+  title = unicodedata.normalize('NFKD', title)
+  title = ''.join(c for c in title if not unicodedata.combining(c))
+  title = re.sub(r'[^a-z0-9]+', ' ', title.lower()).strip()
+  return title if title != '' else None
+
+class TitleIndex:
+  """
+  In-memory lookup of the movies of one media server by
+  normalized title / original title + year and by tmdb / imdb id.
+  An incomplete index (listing the library failed) must not be used for lookups.
+  """
+
+  def __init__(self, complete: bool = True):
+    self.complete = complete
+    self.built_at = time.monotonic()
+    self._by_title_year = {}
+    self._by_uniqueid = {}
+
+  def add(self, movie_id, titles: list[str|None], year, uniqueid: dict|None = None):
+    for title in titles:
+      normalized = normalize(title)
+      if normalized is not None:
+        self._by_title_year.setdefault((normalized, str(year)), movie_id)
+    if uniqueid is not None:
+      for key, value in uniqueid.items():
+        if value is not None and str(value) != '':
+          self._by_uniqueid.setdefault((key.lower(), str(value)), movie_id)
+
+  def find(self, titles: set[str|None], year, uniqueid: dict|None = None):
+    if uniqueid is not None:
+      for key, value in uniqueid.items():
+        movie_id = self._by_uniqueid.get((key.lower(), str(value)))
+        if movie_id is not None:
+          return movie_id
+    for title in titles:
+      normalized = normalize(title)
+      if normalized is None:
+        continue
+      movie_id = self._by_title_year.get((normalized, str(year)))
+      if movie_id is not None:
+        return movie_id
+    return None
+
+  def isStale(self, maxAge: int) -> bool:
+    # retry incomplete indexes earlier
+    age = time.monotonic() - self.built_at
+    return age > maxAge if self.complete else age > min(maxAge, 60)
+
+  def __len__(self) -> int:
+    return len(self._by_title_year)
@@ -0,0 +1,196 @@
+from datetime import datetime
+import json
+import logging
+import os
+import queue
+import threading
+
+from sqlalchemy import text
+
+from api import env
+from api.database import db
+
+logger = logging.getLogger(__name__)
+
+_JOURNAL_FILE = os.environ.get('KT_VOTE_JOURNAL', os.environ.get('KT_DATA_FOLDER', '/data') + '/votes.journal')
+_BATCH_SIZE = env.getInt('KT_VOTE_JOURNAL_BATCH_SIZE', 200)
+_FLUSH_INTERVAL = env.getFloat('KT_VOTE_JOURNAL_INTERVAL', 0.1)
+_RETRY_INTERVAL = 5
+_MAX_ATTEMPTS = max(env.getInt('KT_VOTE_JOURNAL_MAX_ATTEMPTS', 5), 1)
+# votes, which couldnt be written after _MAX_ATTEMPTS, are moved there
+_FAILED_FILE = _JOURNAL_FILE + '.failed'
+
+# votes of deleted sessions are dropped, a newer vote for the same movie replaces the older one
+_UPSERT_QUERY = """
+    INSERT INTO movie_vote
+        (user_id, movie_source, movie_id, session_id, vote, vote_date)
+    SELECT
+        :user_id, :movie_source, :movie_id, :session_id, :vote, :vote_date
+    WHERE
+        EXISTS (SELECT 1 FROM voting_session WHERE id = :session_id)
+    ON CONFLICT (user_id, movie_source, movie_id, session_id) DO UPDATE SET
+        vote = excluded.vote, vote_date = excluded.vote_date
+    WHERE
+        excluded.vote_date >= movie_vote.vote_date
+"""
+
+class VoteJournal:
+  """
+  Write-behind journal for votes. A vote is appended to an append-only log file
+  and queued, a background writer stores the queued votes in batches with one
+  upsert transaction each. The log is truncated, when everything is written,
+  and replayed on startup, so no vote gets lost when the app stops in between.
+  A batch failing KT_VOTE_JOURNAL_MAX_ATTEMPTS times is written vote by vote,
+  votes still failing are logged and moved to <journal>.failed.
+  Votes not yet written can be read with pending().
+  """
+
+  _instance = None
+  _instance_lock = threading.Lock()
+
+  def __new__(cls, *args, **kwargs):
+    with cls._instance_lock:
+      if cls._instance is None:
+        instance = super(VoteJournal, cls).__new__(cls)
+        instance._lock = threading.Lock()
+        instance._queue = queue.Queue()
+        # (session_id, user_id, movie_source, movie_id) -> not yet written vote
+        instance._pending = {}
+        instance._file = None
+        instance._app = None
+        cls._instance = instance
+    return cls._instance
+
+  def start(self, app):
+    with self._lock:
+      if self._app is not None:
+        return
+      self._app = app
+      replayed = self._replay()
+      try:
+        self._file = open(_JOURNAL_FILE, 'a', encoding='utf-8')
+      except OSError as e:
+        logger.error(f"Could not open vote journal {_JOURNAL_FILE} => votes are only queued in memory! {e}")
+    if replayed > 0:
+      logger.info(f"replaying {replayed} votes from vote journal {_JOURNAL_FILE}")
+    threading.Thread(target=self._write, name='vote-journal', daemon=True).start()
+
+  def append(self, session_id: int, user_id: int, movie_source: str, movie_id: str, vote: str) -> datetime:
+    vote_date = datetime.utcnow()
+    entry = {
+      'session_id': session_id,
+      'user_id': user_id,
+      'movie_source': movie_source,
+      'movie_id': str(movie_id),
+      'vote': vote,
+      # same format as the dates stored by sqlite
+      'vote_date': vote_date.strftime('%Y-%m-%d %H:%M:%S.%f'),
+    }
+    with self._lock:
+      if self._file is not None:
+        try:
+          self._file.write(json.dumps(entry) + '\n')
+          self._file.flush()
+          os.fsync(self._file.fileno())
+        except OSError as e:
+          logger.error(f"Exception writing vote journal {_JOURNAL_FILE}: {e}")
+      self._enqueue(entry)
+    return vote_date
+
+  def pending(self, session_id: int) -> list[dict]:
+    with self._lock:
+      return [entry for key, entry in self._pending.items() if key[0] == session_id]
+
+  def _enqueue(self, entry: dict):
+    self._pending[(entry['session_id'], entry['user_id'], entry['movie_source'], entry['movie_id'])] = entry
+    self._queue.put(entry)
+
+  def _replay(self) -> int:
+    if not os.path.exists(_JOURNAL_FILE):
+      return 0
+    count = 0
+    with open(_JOURNAL_FILE, 'r', encoding='utf-8') as journal:
+      for line in journal:
+        try:
+          self._enqueue(json.loads(line))
+          count += 1
+        except ValueError:
+          # last line may be incomplete, if the app stopped while writing it
+          logger.warning(f"skipping invalid line in vote journal {_JOURNAL_FILE}")
+    return count
+
+  def _write(self):
+    batch = []
+    attempts = 0
+    while True:
+      if len(batch) == 0:
+        batch.append(self._queue.get())
+      try:
+        while len(batch) < _BATCH_SIZE:
+          batch.append(self._queue.get(timeout=_FLUSH_INTERVAL))
+      except queue.Empty:
+        pass
+
+      try:
+        self._upsert(batch)
+        logger.debug(f"wrote {len(batch)} votes from vote journal")
+      except Exception as e:
+        attempts += 1
+        if attempts < _MAX_ATTEMPTS:
+          logger.error(f"Exception writing {len(batch)} votes (attempt {attempts}) => retrying in {_RETRY_INTERVAL}s: {e}")
+          threading.Event().wait(_RETRY_INTERVAL)
+          continue
+        logger.error(f"Exception writing {len(batch)} votes (attempt {attempts}) => writing them one by one: {e}")
+        self._writeSingle(batch)
+
+      self._done(batch)
+      batch = []
+      attempts = 0
+
+  def _upsert(self, entries: list[dict]):
+    with self._app.app_context(): # type: ignore
+      try:
+        db.session.execute(text(_UPSERT_QUERY), entries)
+        db.session.commit()
+      except Exception:
+        db.session.rollback()
+        raise
+
+  def _writeSingle(self, batch: list[dict]):
+    failed = []
+    for entry in batch:
+      try:
+        self._upsert([entry])
+      except Exception as e:
+        logger.error(f"Exception writing vote {json.dumps(entry)} => moving it to {_FAILED_FILE}: {e}")
+        failed.append(entry)
+    if len(failed) <= 0:
+      return
+    try:
+      with open(_FAILED_FILE, 'a', encoding='utf-8') as failedFile:
+        for entry in failed:
+          failedFile.write(json.dumps(entry) + '\n')
+    except OSError as e:
+      logger.error(f"Exception writing {_FAILED_FILE} => {len(failed)} votes are lost: {e}")
+
+  def _done(self, batch: list[dict]):
+    with self._lock:
+      for entry in batch:
+        key = (entry['session_id'], entry['user_id'], entry['movie_source'], entry['movie_id'])
+        if self._pending.get(key) is entry:
+          del self._pending[key]
+      if self._queue.empty():
+        self._truncate()
+
+  def _truncate(self):
+    if self._file is None:
+      return
+    try:
+      self._file.truncate(0)
+      os.fsync(self._file.fileno())
+    except OSError as e:
+      logger.error(f"Exception truncating vote journal {_JOURNAL_FILE}: {e}")
+
+  @staticmethod
+  def getInstance() -> 'VoteJournal':
+    return VoteJournal()
@@ -2,11 +2,15 @@ import logging
 import os
 import platform
 from flask import Flask
+from api import env
 from api.executor import ExecutorManager
+from api.movie_store import MovieStore
+from api.poster_store import PosterStore
 from api.sources.source import Source
 from api.sources.tmdb import Tmdb
+from api.vote_journal import VoteJournal
 from config import Config
-from api.database import check_db, init_db, drop_tables, create_all
+from api.database import check_db, check_query_plans, init_db, drop_tables, create_all, optimize_db
 from api.routes import movie, user, vote
 from api.routes import session as votingsession
 from web.routes import main
@@ -47,6 +51,14 @@ def create_app():
             raise Exception("DB structure does not match models:\n" + "\n".join(errors)
                             + "\nDropping of these tables doesnt work!"
                             + "\nPlease delete your database and let K-inder create a new on next start!")
+    for error in errors:
+        logging.getLogger(__name__).error(error)
+    for warning in check_query_plans(app):
+        logging.getLogger(__name__).warning(warning)
+    VoteJournal.getInstance().start(app)
+    optimize_interval = env.getInt('KT_SQLITE_OPTIMIZE_INTERVAL', 3600)
+    if optimize_interval > 0:
+        ExecutorManager.repeat(optimize_interval, optimize_db, app)
 
     # public apidocs under http://<IP>:<PORT>/apidocs/ verfügbar
     if eval(os.environ.get('KT_SERVER_SWAGGER', 'False')):
@@ -71,10 +83,15 @@ def create_app():
         app.before_request_funcs[None].remove(init_caches)
         # Prefetching and caching all genres and providers
         # and by that, also check reachability of all apis
+        PosterStore.getInstance()
+        ExecutorManager.repeat(86400, MovieStore.getInstance().purge)
         movie.list_genres(os.environ.get('KT_TMDB_API_LANGUAGE', 'de-DE'))
         Tmdb.getInstance().listRegions()
         Tmdb.getInstance().listProviders()
-        ExecutorManager.repeat(int(os.environ.get('KT_API_AVAILABILITY_RECHECK', '900')), Source.apisDisabled, True)
+        ExecutorManager.repeat(env.getInt('KT_API_AVAILABILITY_RECHECK', 900), Source.apisDisabled, True)
+        rate_log_interval = env.getInt('KT_TMDB_API_RATE_LOG_INTERVAL', 3600)
+        if rate_log_interval > 0:
+            ExecutorManager.repeat(rate_log_interval, Tmdb.getInstance().logRateLimitStats)
 
     return app
 
@@ -0,0 +1,20 @@
+import pytest
+from flask import Flask
+
+from api.database import _full_scans, check_query_plans, create_all, init_db
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    init_db(app)
+    create_all(app)
+    return app
+
+def test_hot_queries_dont_scan(app):
+    assert check_query_plans(app) == []
+
+def test_scan_is_detected(app):
+    with app.app_context():
+        assert len(_full_scans("SELECT movie_id FROM movie_vote WHERE vote = :vote", {'vote': 'PRO'})) > 0
+        assert len(_full_scans("SELECT movie_id FROM movie_vote ORDER BY session_id")) > 0
@@ -16,7 +16,7 @@ export class Fetcher {
     #settings;
     #usernamesSuggestions;
 
-    #session_status_cache = new Map(); // { session_id: { status, timestamp } }
+    #session_status_cache = new Map(); // { session_id: { status, timestamp, etag } }
 
     constructor() {
     }
@@ -44,11 +44,50 @@ export class Fetcher {
         if (!forceFresh && cache && (now - cache.timestamp < (Kinder.sessionStatusInterval - 100))) {
             return cache.status;
         }
-        let status = await this.#get('/session/status/' + session_id);
-        this.#session_status_cache.set(session_id, { status: status, timestamp: now });
+        let endpoint = '/session/status/' + session_id;
+        if (cache && cache.status && cache.status.version !== undefined) {
+            endpoint += '?since=' + cache.status.version;
+        }
+        const response = await this.#getConditional(endpoint, cache ? cache.etag : null);
+        let status = response.notModified ? cache.status : response.body;
+        if (!response.notModified && status.since !== undefined && cache && cache.status) {
+            status = this.#mergeSessionStatus(cache.status, status);
+        }
+        this.#session_status_cache.set(session_id, { status: status, timestamp: now, etag: response.etag });
         return status;
     }
 
+    #mergeSessionStatus(previous, delta) {
+        // the delta only contains the votes changed since the given version
+        const votes = new Map();
+        for (const vote of previous.votes.concat(delta.votes)) {
+            votes.set(vote.movie_source + ':' + vote.movie_id.id, vote);
+        }
+        const status = Object.assign({}, delta);
+        delete status.since;
+        status.votes = Array.from(votes.values());
+        return status;
+    }
+
+    subscribeEvents(session_id, handlers) {
+        if (typeof EventSource === 'undefined') {
+            return null;
+        }
+        let url = this.#apiBaseUrl() + '/session/events';
+        if (session_id !== undefined && session_id !== null && session_id !== '') {
+            url += '?session_id=' + parseInt(session_id);
+        }
+        const source = new EventSource(url);
+        for (const [event, handler] of Object.entries(handlers)) {
+            source.addEventListener(event, (e) => handler(JSON.parse(e.data)));
+        }
+        return source;
+    }
+
+    static isSubscribed(source) {
+        return source !== null && source !== undefined && source.readyState === EventSource.OPEN;
+    }
+
     async voteMovie(sessionId, userId, movieId, vote) {
         let data = {
             session_id: sessionId,
@@ -232,6 +271,26 @@ export class Fetcher {
         }
     }
 
+    async #getConditional(endpoint, etag, baseUrl = this.#apiBaseUrl()) {
+        const headers = {};
+        if (etag) {
+            headers['If-None-Match'] = etag;
+        }
+        const response = await fetch(baseUrl + endpoint, {
+            method: 'GET',
+            headers: headers,
+        });
+        if (response.status === 304) {
+            return { notModified: true, etag: etag, body: null };
+        }
+        if (response.status === 500) {
+            const error = this.#extractErrorFromResponseText(await response.text());
+            Kinder.masterError(error);
+            throw new Error('received 500 status code!');
+        }
+        return { notModified: false, etag: response.headers.get('ETag'), body: await response.json() };
+    }
+
     async #get(endpoint, baseUrl = this.#apiBaseUrl(), asJson=true) {
         const response = await fetch(baseUrl + endpoint, {
             method: 'GET',
@@ -41,6 +41,7 @@ export class Login {
     #startDate = new Date();
     #knownSessionIds = new Set();
     #sessionCheckInterval = null;
+    #sessionEvents = null;
 
     constructor() {
         this.#init();
@@ -134,6 +135,9 @@ export class Login {
             if (this.#sessionCheckInterval !== null) {
                 clearInterval(this.#sessionCheckInterval);
             }
+            if (this.#sessionEvents !== null) {
+                this.#sessionEvents.close();
+            }
             Kinder.setCookie('username', user.name, 14);
             Kinder.setSession(session);
             Kinder.setUser(user);
@@ -306,7 +310,17 @@ export class Login {
             this.#sessionNewTab.classList.remove('active');
             this.#sessionJoinTab.dispatchEvent(new Event('click'));
         }
-        this.#sessionCheckInterval = setInterval(() => { _this.#checkForNewSessions(); }, 3500);
+        if (this.#sessionEvents === null) {
+            this.#sessionEvents = Fetcher.getInstance().subscribeEvents(null, {
+                'session-created': () => { _this.#checkForNewSessions(); }
+            });
+        }
+        // polling only as fallback, if no events can be received
+        this.#sessionCheckInterval = setInterval(() => {
+            if (!Fetcher.isSubscribed(_this.#sessionEvents)) {
+                _this.#checkForNewSessions();
+            }
+        }, 3500);
     }
 
     async #checkForNewSessions() {
@@ -26,6 +26,8 @@ export class SessionStatus {
     #topAndFlopMovies = new Map(); // movie_id -> vote
     #knownUsers = null;
     #refreshRunning = false;
+    #events = null;
+    #statusVersion = 0;
 
     #autoRefresh = null;
     #maxVoteCountInitialized = false;
@@ -43,7 +45,18 @@ export class SessionStatus {
         this.#init();
         let _this = this
         this.#refreshTopsAndFlops(true);
-        this.#autoRefresh = setInterval(() => { _this.#refreshTopsAndFlops(); }, Kinder.sessionStatusInterval);
+        const onEvent = (e) => { _this.#refreshForEvent(e); };
+        this.#events = Fetcher.getInstance().subscribeEvents(this.#session.session_id, {
+            'user-joined': onEvent,
+            'vote': onEvent,
+            'match': onEvent
+        });
+        // polling only as fallback, if no events can be received
+        this.#autoRefresh = setInterval(() => {
+            if (!Fetcher.isSubscribed(_this.#events)) {
+                _this.#refreshTopsAndFlops();
+            }
+        }, Kinder.sessionStatusInterval);
 
         document.addEventListener('kinder.over.voter', () => { _this.#over(); });
         document.querySelector(this.#statusSelector).addEventListener('hide.bs.modal', () => {
@@ -149,12 +162,24 @@ export class SessionStatus {
         }
     }
     
+    async #refreshForEvent(event) {
+        await this.#refreshTopsAndFlops(true);
+        // the server rebuilds the status only once per interval, so it may be older than the event
+        if (this.#statusVersion < event.version) {
+            let _this = this;
+            setTimeout(() => { _this.#refreshForEvent(event); }, 1000);
+        }
+    }
+
     async #refreshTopsAndFlops(forceFresh = false) {
         if (this.#refreshRunning) {
             return;
         }
         this.#refreshRunning = true;
         let status = await Fetcher.getInstance().getSessionStatus(this.#session.session_id, forceFresh);
+        if (status.version !== undefined) {
+            this.#statusVersion = status.version;
+        }
 
         //     "session": {
         //       "name": "movienight",